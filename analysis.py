@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from chess import Board, COLOUR_INFO
+from engine import Engine, MAXN, BRS, INF
+
+#Plies searched for each root move, the root move included
+ANALYSIS_DEPTH = 3
+
+#Boards of a worker process by shape, reused between tasks
+worker_boards = {}
+
+#Multi-PV analysis - the k best moves of the side to play, each as a dict
+#of move, code (start and end square names), values (share vector of every
+#colour index at the end of its line), pv (starting with the move) and
+#nodes, best first for the side to play. Every root move is searched to
+#depth as its own task on a process pool - the workers take the next task
+#as they finish one, so a slow subtree holds up one worker and not the
+#rest. Tasks carry Board.board_to_state rather than the board. executor is
+#used instead of a new pool of workers processes when given
+def analyse(board, k = 3, depth = ANALYSIS_DEPTH, strategy = MAXN,
+            workers = None, executor = None):
+    engine = Engine(board, strategy)
+    if engine.terminal():
+        return []
+    moves = engine.ordered(list(board.legal_moves(board.to_play)))
+    if not moves:
+        return []
+
+    root = COLOUR_INFO.index(board.to_play)
+    shape = (board.nrows, board.ncols, board.corner, board.rules,
+            board.prom_rf)
+    state = board.board_to_state()
+    pool = executor
+    if pool is None:
+        pool = ProcessPoolExecutor(workers)
+    results = []
+    try:
+        tasks = {pool.submit(root_search, shape, state, rec, depth,
+                strategy): i for i, rec in enumerate(moves)}
+        for task in as_completed(tasks):
+            result = task.result()
+            result['code'] = board.move_code(result['move'])
+            results.append((tasks[task], result))
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    results.sort(key = lambda item: (-item[1]['values'][root], item[0]))
+    return [result for i, result in results[:k]]
+
+#Searches the position of state after rec in a worker process, the values
+#of the line found are those of every colour at its end
+def root_search(shape, state, rec, depth, strategy):
+    if shape not in worker_boards:
+        worker_boards[shape] = Board(*shape)
+    board = worker_boards[shape]
+    board.state_to_board(state)
+    engine = Engine(board, strategy)
+    root = COLOUR_INFO.index(board.to_play)
+    engine.move_apply(rec)
+    if strategy == MAXN:
+        values, pv = engine.maxn(depth - 1, 0)
+    else:
+        if strategy == BRS:
+            value, pv = engine.brs(depth - 1, -INF, INF, root)
+        else:
+            value, pv = engine.paranoid(depth - 1, -INF, INF, root)
+        values = engine.pv_values(pv, root, depth - 1)
+    return {'move': rec, 'values': values, 'pv': [rec] + pv,
+            'nodes': engine.nodes}
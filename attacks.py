@@ -0,0 +1,160 @@
+from geometry import HORI, DIAG
+from mailbox import TYPE_CODES, TYPE_MASK, COLOUR_SHIFT, DEAD_BIT, EMPTY
+from bitboard import tables_get
+
+PAWN = TYPE_CODES['Pawn']
+KNIGHT = TYPE_CODES['Knight']
+BISHOP = TYPE_CODES['Bishop']
+ROOK = TYPE_CODES['Rook']
+QUEEN = TYPE_CODES['Queen']
+KING = TYPE_CODES['King']
+
+#Directions each slider type moves along, by type code
+SLIDER_DIRECTIONS = {BISHOP: frozenset(DIAG), ROOK: frozenset(HORI),
+                    QUEEN: frozenset(range(8))}
+
+#counts[cidx][sq] - number of live pieces of colour index cidx attacking
+#square sq, a bytearray per colour as a colour has at most 16 pieces. Kept in step with the mailbox from Board.square_update, a change
+#on one square moves the attacks of the piece leaving/arriving there and of
+#the sliders whose rays run through it, nothing else is recomputed. The
+#occupancy and live slider masks find the slider looking at a square without
+#walking the cells in between
+class AttackMaps:
+    def __init__(self, geometry, pawn_steps, mailbox):
+        self.geometry = geometry
+        self.mailbox = mailbox
+        self.tables = tables_get(geometry, pawn_steps)
+        self.counts = [bytearray(geometry.n) for i in range(4)]
+        self.occ = 0
+        self.sliders = 0
+        self.pawn_targets = self.tables.pawn_targets
+
+    #Recomputes every count from the mailbox
+    def rebuild(self):
+        self.counts = [bytearray(self.geometry.n) for i in range(4)]
+        self.occ = 0
+        self.sliders = 0
+        for sq in range(self.geometry.n):
+            code = self.mailbox.get(sq)
+            if code > 0:
+                self.occ = self.occ | (1 << sq)
+        for sq in range(self.geometry.n):
+            code = self.mailbox.get(sq)
+            if code > 0 and not code & DEAD_BIT:
+                self.piece_add(sq, code, 1)
+                if (code & TYPE_MASK) in SLIDER_DIRECTIONS:
+                    self.sliders = self.sliders | (1 << sq)
+
+    #Called before the mailbox cell of sq changes from old_code to new_code
+    def update(self, sq, old_code, new_code):
+        if old_code == new_code:
+            return
+        bit = 1 << sq
+        if old_code > 0 and not old_code & DEAD_BIT:
+            self.piece_add(sq, old_code, -1)
+            self.sliders = self.sliders & ~bit
+        if (old_code > 0) != (new_code > 0):
+            self.occ = self.occ ^ bit
+            self.ray_update(sq, 1 if new_code == EMPTY else -1)
+        if new_code > 0 and not new_code & DEAD_BIT:
+            self.piece_add(sq, new_code, 1)
+            if (new_code & TYPE_MASK) in SLIDER_DIRECTIONS:
+                self.sliders = self.sliders | bit
+
+    #Adds delta to the count of every square attacked by the piece with
+    #code on sq
+    def piece_add(self, sq, code, delta):
+        counts = self.counts[(code >> COLOUR_SHIFT) & 3]
+        kind = code & TYPE_MASK
+        if kind == PAWN:
+            targets = self.pawn_targets[(code >> COLOUR_SHIFT) & 3][sq]
+        elif kind == KNIGHT:
+            targets = self.geometry.knight[sq]
+        elif kind == KING:
+            targets = self.geometry.king[sq]
+        else:
+            for d in SLIDER_DIRECTIONS[kind]:
+                self.ray_add(counts, sq, d, delta)
+            return
+        for target in targets:
+            counts[target] = counts[target] + delta
+
+    #Adds delta to counts for the squares from sq along direction d up to
+    #and including the first occupied square
+    def ray_add(self, counts, sq, d, delta):
+        occ = self.occ
+        for target in self.geometry.rays[sq][d]:
+            counts[target] = counts[target] + delta
+            if (occ >> target) & 1:
+                break
+
+    #sq is emptied (delta 1) or filled (delta -1) - every live slider
+    #looking at sq gains/loses the squares behind it
+    def ray_update(self, sq, delta):
+        tables = self.tables
+        if not tables.lines[sq] & self.sliders:
+            return
+        rays = tables.rays[sq]
+        for d in range(8):
+            back = 7 - d
+            blockers = rays[back] & self.occ
+            if not blockers:
+                continue
+            if tables.positive[back]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            if not (self.sliders >> blocker) & 1:
+                continue
+            code = self.mailbox.get(blocker)
+            if d not in SLIDER_DIRECTIONS[code & TYPE_MASK]:
+                continue
+            self.ray_add(self.counts[(code >> COLOUR_SHIFT) & 3], sq, d, delta)
+
+    #True if a live piece of a colour index other than cidx attacks sq, found
+    #by walking the mailbox out from sq rather than from the counts - for
+    #positions the counts are not kept for
+    def scan(self, sq, cidx):
+        mailbox = self.mailbox
+        cells = mailbox.cells
+        pad_index = mailbox.pad_index
+        start = pad_index[sq]
+        for d, offset in enumerate(mailbox.offsets):
+            cell = start + offset
+            code = cells[cell]
+            if code == EMPTY:
+                cell = cell + offset
+                code = cells[cell]
+                while code == EMPTY:
+                    cell = cell + offset
+                    code = cells[cell]
+                near = False
+            else:
+                near = True
+            if (code <= 0 or code & DEAD_BIT or
+                    (code >> COLOUR_SHIFT) & 3 == cidx):
+                continue
+            kind = code & TYPE_MASK
+            if kind in SLIDER_DIRECTIONS:
+                if d in SLIDER_DIRECTIONS[kind]:
+                    return True
+            elif near:
+                if kind == KING:
+                    return True
+                if kind == PAWN and sq in self.pawn_targets[
+                        (code >> COLOUR_SHIFT) & 3][mailbox.cell_sq[cell]]:
+                    return True
+        for target in self.geometry.knight[sq]:
+            code = cells[pad_index[target]]
+            if (code > 0 and code & TYPE_MASK == KNIGHT and
+                    not code & DEAD_BIT and
+                    (code >> COLOUR_SHIFT) & 3 != cidx):
+                return True
+        return False
+
+    #True if a live piece of a colour index other than cidx attacks sq
+    def attacked(self, sq, cidx):
+        for colour_idx, counts in enumerate(self.counts):
+            if colour_idx != cidx and counts[sq]:
+                return True
+        return False
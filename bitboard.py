@@ -0,0 +1,44 @@
+from geometry import DIRECTIONS
+
+#Cache of tables so every board of the same geometry shares them
+table_cache = {}
+
+#Attack masks for a board geometry held as Python ints with bit sq set for
+#square index sq. Rays stop at the edge or a blocked corner like the
+#geometry rays they are built from
+class BitboardTables:
+    def __init__(self, geometry, pawn_steps):
+        self.n = geometry.n
+
+        #positive directions step to higher square indices so the nearest
+        #blocker on a ray is its lowest set bit, otherwise its highest
+        self.positive = [r_step*geometry.ncols + f_step > 0
+                for f_step, r_step in DIRECTIONS]
+
+        #lines[sq] - every square on the 8 rays from sq
+        self.rays = []
+        self.lines = []
+        self.knight = []
+        for sq in range(geometry.n):
+            self.rays.append([squares_mask(ray) for ray in geometry.rays[sq]])
+            self.lines.append(squares_mask(target for ray in geometry.rays[sq]
+                    for target in ray))
+            self.knight.append(squares_mask(geometry.knight[sq]))
+
+        #pawn_targets[direction][sq] - the squares attacked by a pawn on sq
+        self.pawn_targets = tuple(tuple(tuple(target
+                for target in sq_steps[2:] if target is not None)
+                for sq_steps in steps) for steps in pawn_steps)
+
+def tables_get(geometry, pawn_steps):
+    key = (geometry.nrows, geometry.ncols, geometry.corner)
+    if key not in table_cache:
+        table_cache[key] = BitboardTables(geometry, pawn_steps)
+    return table_cache[key]
+
+def squares_mask(squares):
+    mask = 0
+    for sq in squares:
+        if sq is not None:
+            mask = mask | (1 << sq)
+    return mask
@@ -5,6 +5,14 @@ import tkinter as tk
 import time
 import pyperclip
 import random
+from collections import namedtuple
+from geometry import geometry_get, between_table, HORI, DIAG
+from mailbox import Mailbox, piece_code, code_free, code_colour, EMPTY, \
+        TYPE_CODES, TYPE_MASK, DEAD_BIT
+from attacks import AttackMaps, SLIDER_DIRECTIONS
+from movecache import MoveCache
+from zobrist import keys_get
+from evaluation import evaluator_get
 
 #Colours available in four player chess
 COLOUR_INFO = ['Red', 'Blue', 'Yellow', 'Green']
@@ -21,6 +29,81 @@ PIECE_INFO = {
 
 alphabet = string.ascii_lowercase
 
+#Per colour direction table indexed by Piece.direction (the colour's index in
+#COLOUR_INFO). Vectors are [change in rank, change in file] - forward is the
+#pawn direction, diag_L/diag_R the pawn captures and castle the king side
+#step for each side. rook_steps are the rook start/end squares in king side
+#castle steps from the king's square after castling
+def direction_table(c, s, direct):
+    if direct % 2 == 0:
+        diag_L, diag_R = (c-s, s-c), (c+s, s+c)
+    else:
+        diag_R, diag_L = (c-s, s-c), (c+s, s+c)
+    return {'forward': (c, s), 'double': (2*c, 2*s), 'diag_L': diag_L,
+            'diag_R': diag_R, 'castle': {'King': (s, c), 'Queen': (-s, -c)},
+            'castle_dist': {'King': 3, 'Queen': 4},
+            'rook_steps': {'King': (1, -1), 'Queen': (-2, 1)}}
+
+DIRECTION_INFO = [direction_table(1, 0, 0), direction_table(0, 1, 1),
+                direction_table(-1, 0, 2), direction_table(0, -1, 3)]
+
+#Cache of (promotion squares, pawn steps) per board geometry and promotion
+#rank/file so that every board of the same shape shares them
+direction_cache = {}
+
+#Compact move record yielded by the move generator - start/end are square
+#indices ((rank-1)*ncols + file-1) and flag is a combination of move flags
+MoveRec = namedtuple('MoveRec', ['start', 'end', 'flag'])
+
+#Stand-in last_move for pawns loaded away from their home rank so they
+#count as moved (no double push and nothing to take en passant)
+LastMove = namedtuple('LastMove', ['double_push', 'total_number'])
+FEN_MOVED = LastMove(False, 0)
+
+QUIET = 0
+DOUBLE_PUSH = 1
+ENPASSANT = 2
+PROMOTION = 4
+KING_CASTLE = 8
+QUEEN_CASTLE = 16
+
+#Squares on which a pawn promotes per direction (the prom_rf rank or file
+#counted from the colour's own side) and the forward/double/diag_L/diag_R
+#target square of a pawn on each square, built on first use per shape
+def direction_tables_get(geometry, prom_rf):
+    key = (geometry.nrows, geometry.ncols, geometry.corner, prom_rf)
+    if key in direction_cache:
+        return direction_cache[key]
+
+    nrows, ncols = geometry.nrows, geometry.ncols
+    prom_squares = []
+    pawn_steps = []
+    for info in DIRECTION_INFO:
+        c, s = info['forward']
+        if c != 0:
+            rank = prom_rf if c > 0 else nrows - prom_rf + 1
+            squares = [(rank-1)*ncols + j for j in range(ncols)]
+        else:
+            file_ = prom_rf if s > 0 else ncols - prom_rf + 1
+            squares = [i*ncols + file_-1 for i in range(nrows)]
+        prom_squares.append(frozenset(squares))
+
+        steps = []
+        for sq in range(geometry.n):
+            rank, file_ = divmod(sq, ncols)
+            sq_steps = []
+            for step_key in ('forward', 'double', 'diag_L', 'diag_R'):
+                r_step, f_step = info[step_key]
+                if geometry.on_board(rank + r_step, file_ + f_step):
+                    sq_steps.append((rank + r_step)*ncols + file_ + f_step)
+                else:
+                    sq_steps.append(None)
+            steps.append(tuple(sq_steps))
+        pawn_steps.append(tuple(steps))
+
+    direction_cache[key] = (tuple(prom_squares), tuple(pawn_steps))
+    return direction_cache[key]
+
 #Creates class for chessboard
 class Board:
     #Default board is set as 14 rows/columns and with RBYG colours
@@ -31,6 +114,21 @@ class Board:
         self.corner = corner
         self.rules = rules
         self.prom_rf = prom_rf
+        self.geometry = geometry_get(nrows, ncols, corner)
+        self.direction_init()
+        self.mailbox = Mailbox(self.geometry)
+        self.attack_maps = AttackMaps(self.geometry, self.pawn_steps,
+                self.mailbox)
+        self.move_cache = MoveCache(self)
+        self.zobrist = keys_get(self.geometry.n)
+        self.key = 0
+
+        #Running evaluation per colour index kept by square_update, checked
+        #against a full recompute on every read when eval_debug is set
+        self.evaluator = evaluator_get({name: info['value'] for name, info
+                in PIECE_INFO.items()}, nrows, ncols, prom_rf)
+        self.eval_scores = [0, 0, 0, 0]
+        self.eval_debug = False
         
         self.colours = [colour for colour in COLOUR_INFO]
         self.to_play = COLOUR_INFO[0]
@@ -49,23 +147,40 @@ class Board:
         self.squares = np.empty((self.nrows, self.ncols), dtype = 'object')
         self.move_list = []
         self.resign_list = []
+        self.undo_stack = []
 
         self.game_over = False
 
+        #Called with the board after every move made by move (Ponderer
+        #follows the game with them)
+        self.move_listeners = []
+
         self.board_init()
         self.colour_init()
         self.piece_init()
 
+        #Pawns of double pushes as (piece, total_number) in the order played,
+        #the few last ones giving the en passant part ep_key of the key
+        self.ep_pushes = []
+        self.ep_key = 0
+        self.key_reset()
+
     #Squares initialised to position on board
     def board_init(self):
         for i in range(self.nrows):
             for j in range(self.ncols):
-                if ((i < self.corner or i >= self.nrows - self.corner) 
-                    and (j < self.corner or j >= self.ncols - self.corner)):
-                    self.squares[i][j] = Square(i+1, j+1, blocked = True)
-                else:
-                    self.squares[i][j] = Square(i+1, j+1)
+                idx = i*self.ncols + j
+                self.squares[i][j] = Square(i+1, j+1,
+                        blocked = self.geometry.blocked[idx], idx = idx,
+                        board = self)
+        self.square_list = list(self.squares.ravel())
     
+    #Per direction tables for this board shape, shared through
+    #direction_tables_get
+    def direction_init(self):
+        self.prom_squares, self.pawn_steps = direction_tables_get(
+                self.geometry, self.prom_rf)
+
     def colour_init(self):
         for colour in COLOUR_INFO:
             if colour not in self.piece_pos:
@@ -94,7 +209,12 @@ class Board:
         self.piece_pos_init()
 
     def piece_fen_init(self, fen_board):
+        for square in self.square_list:
+            if square.piece is not None:
+                square.piece.loc = None
+                square.remove_piece()
         self.piece_pos = {}
+        self.king_loc = {}
         self.colour_init()
         if fen_board[:1] == '\n':
             fen_board = fen_board[1:]
@@ -132,13 +252,26 @@ class Board:
                 
         self.piece_pos_init(start_square_info = False)
 
+        for colour in COLOUR_INFO:
+            for piece in self.piece_pos[colour]:
+                if piece.name == 'Pawn' and not self.pawn_home(piece):
+                    piece.last_move = FEN_MOVED
+
+    #True if a pawn stands on its colour's starting rank/file - two steps
+    #back from there is off the board
+    def pawn_home(self, piece):
+        file_, rank = move_to_rank_file(piece.loc)
+        r_step, f_step = DIRECTION_INFO[piece.direction]['forward']
+        r_index, f_index = rank - 1 - 2*r_step, file_ - 1 - 2*f_step
+        return not (0 <= r_index < self.nrows and 0 <= f_index < self.ncols)
+
     def piece_pos_init(self, start_square_info = True):
         for square in self.squares.ravel():
             piece = square.piece
             if piece == None:
                 continue
-            elif square.piece == 'King':
-                self.king_loc[piece.colour].append(piece.loc)
+            elif piece.name == 'King':
+                self.king_loc[piece.colour] = piece.loc
             
             self.piece_pos[piece.colour].append(piece)
             if not start_square_info:
@@ -245,19 +378,31 @@ class Board:
         #Confirm whether move caused a new check
         if king_checks:
             attempt_move.checks = king_checks
-            prev_move_checks = self.move_list[-1].checks
+            if self.move_list:
+                prev_move_checks = self.move_list[-1].checks
+            else:
+                prev_move_checks = {}
             new_checks = self.new_check_test(king_checks, prev_move_checks)
         else:
             new_checks = 0
 
-        new_stale = self.stalemate_test()
+        new_stale = self.stalemate_test(colour)
 
         #If reaches here then move is allowed to occur and is recorded
         self.move_updates(attempt_move, piece_start, old_piece, end_square, 
                 new_checks, new_mates, new_stale, colour, enpassant_piece, resign)
 
+        for listener in list(self.move_listeners):
+            listener(self)
+
         return True
 
+    #Pickled boards (for SMP workers) leave the move listeners behind
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['move_listeners'] = []
+        return state
+
     def game_over_check(self):
         return len(self.colours) - len(self.resign_list) == 1
 
@@ -277,6 +422,9 @@ class Board:
                 attempt_move.extra_resign.append(col__)
 
         end_square.piece.last_move = attempt_move
+        if attempt_move.double_push:
+            self.ep_pushes.append((end_square.piece,
+                    attempt_move.total_number))
         self.move_list.append(attempt_move)
         
         if piece_start.promoted == 'Temp':
@@ -290,27 +438,24 @@ class Board:
         attempt_move.half_move = self.half_moves
         attempt_move.new_checks = new_checks
         col_idx = (self.colours.index(clr) + 1)% (len(self.colours))
-        self.to_play = self.colours[col_idx]
+        self.to_play_set(self.colours[col_idx])
 
         if piece_start.name == 'King':
-            self.king_castle[clr] = 0
-            self.queen_castle[clr] = 0
+            self.castle_set(clr, 'King', 0)
+            self.castle_set(clr, 'Queen', 0)
 
         elif piece_start.name == 'Rook':
             rook_type = piece_start.rook_type(self.king_loc[clr])
-            if rook_type == 'King':
-                self.king_castle[clr] = 0
-            elif rook_type == 'Queen':
-                self.queen_castle[clr] = 0
+            if rook_type in ('King', 'Queen'):
+                self.castle_set(clr, rook_type, 0)
         
         if old_piece and not old_piece.dead:
             if old_piece.name == 'Rook':
                 rook_type = old_piece.rook_type(self.king_loc[old_piece.colour],
                         attempt_move.start)
-                if rook_type == 'King':
-                    self.king_castle[old_piece.colour] = 0
-                elif rook_type == 'Queen':
-                    self.queen_castle[old_piece.colour] = 0
+                if rook_type in ('King', 'Queen'):
+                    self.castle_set(old_piece.colour, rook_type, 0)
+        self.ep_update()
 
         self.score_update(new_checks, new_mates, new_stale, piece_start, 
                 old_piece, enpassant_piece, clr, attempt_move.draw, game_over,
@@ -401,27 +546,8 @@ class Board:
         if piece.name != 'Pawn':
             return False
     
-        file_, rank = move_to_rank_file(square_code)
-        theta = np.radians(90*piece.direction)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
-
-        if c > 0.5:
-            prom_rf = self.prom_rf*c
-            piece_rf = rank
-        elif c < -0.5:
-            prom_rf = self.nrows + self.prom_rf*c + 1
-            piece_rf = rank
-        elif s > 0.5:
-            prom_rf = self.prom_rf*s
-            piece_rf = file_
-        elif s < -0.5:
-            prom_rf = self.ncols + self.prom_rf*s + 1
-            piece_rf = file_
-
-        if prom_rf == piece_rf:
-            return True
-        else:
-            return False
+        return (self.geometry.index[square_code] in
+                self.prom_squares[piece.direction])
 
     #Confirms the status of all kings for checks
     def all_check_test(self):
@@ -430,6 +556,8 @@ class Board:
         for key in self.king_loc:
             king_col = key
             king_loc = self.king_loc[key]
+            if not self.square_attacked(king_col, self.geometry.index[king_loc]):
+                continue
             piece_checks = self.check_test(king_col, king_loc)
 
             if piece_checks:
@@ -451,19 +579,16 @@ class Board:
 
     def castle_checking(self, piece, attempt_move):
         
-        direct = piece.direction
-        theta = np.radians(90*direct)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
-        r_step, f_step = s, c
+        castle_side = attempt_move.castling
+        r_step, f_step = DIRECTION_INFO[piece.direction]['castle'][castle_side]
         
         k_file, k_rank = move_to_rank_file(attempt_move.start)
         i = 0
 
         while i < 2:
             k_file_test, k_rank_test = k_file+i*f_step, k_rank+i*r_step
-            king_pos_test = rank_file_to_move(k_file_test, k_rank_test)
-            checks = self.check_test(attempt_move.colour, king_pos_test)
-            if len(checks) > 0:
+            sq = (k_rank_test - 1)*self.ncols + k_file_test - 1
+            if self.square_attacked(attempt_move.colour, sq):
                 return False
             i = i + 1
         return True
@@ -501,7 +626,7 @@ class Board:
         knight_checks = self.knight_extent(king_loc)
 
         for knight in knight_checks:
-            if knight.colour != king_col:
+            if knight.colour != king_col and not knight.dead:
                 king_checks.append(knight)
 
         return king_checks
@@ -512,224 +637,80 @@ class Board:
 
         #list of piece in line of sight (los)
         los_list = []
-       
-        file_, rank = move_to_rank_file(move_code)
+        rays = self.geometry.rays[self.geometry.index[move_code]]
 
-        #8 direction vectors for hori/verti/diag from king to loop over
         if extent_type == 'all':
-            loop_directions = [[-1, -1], [-1, 0], [-1, 1], [0, -1],
-                            [0, 1], [1, -1], [1, 0], [1, 1]]
+            loop_directions = rays
         elif extent_type == 'hori':
-            loop_directions = [[-1, 0], [0, -1], [0, 1], [1, 0]]
-
+            loop_directions = [rays[d] for d in HORI]
         elif extent_type == 'diag':
-            loop_directions = [[-1, -1], [-1, 1], [1, -1], [1, 1]]
-
-        for idx, val in enumerate(loop_directions):
-            f_index = file_ - 1 
-            r_index = rank - 1
-            f_step = val[0]
-            r_step = val[1]
-            stop = False
-
-            #f/r indices need to be within extent of cols/rows of board 
-            while ((f_index < self.ncols and f_index >= 0) and
-                    (r_index < self.nrows and r_index >= 0) and 
-                    stop == False):
-                
-                #f/r indices updated at start so that starting square not used
-                f_index = f_index + f_step
-                r_index = r_index + r_step
-
-                #if index update pushes index out of board extent continues
-                if f_index < 0 or r_index < 0:
-                    continue
-
-                #tries to check for obstruction except if out of board extent
-                try:
-                    los = self.squares[r_index][f_index].obstruct()
-                except IndexError:
-                    continue
-
-                if include_gap and los == False:
-                    los_list.append(self.squares[r_index][f_index].name)
-
-                #if obstruct = False or True then no piece obstruction found
-                #booleans are counted as integers in isinstance
-                if not isinstance(los, int):
-                    stop = True
+            loop_directions = [rays[d] for d in DIAG]
+
+        #rays stop at the board edge or blocked squares so only pieces
+        #can end the line of sight
+        for ray in loop_directions:
+            for sq in ray:
+                square = self.square_list[sq]
+                if square.piece is None:
                     if include_gap:
-                        los_list.append(los.loc)
-                    else:
-                        los_list.append(los)
+                        los_list.append(square.name)
+                    continue
+                if include_gap:
+                    los_list.append(square.name)
+                else:
+                    los_list.append(square.piece)
+                break
                 
         return los_list
 
     def knight_extent(self, move_code, start_square = False):
         knight_list = []
 
-        file_, rank = move_to_rank_file(move_code)
-        f_index_start = file_ - 1
-        r_index_start = rank - 1
-        knight_moves = [[2, 1], [2, -1], [-2, 1], [-2, -1],
-                        [1, 2], [1, -2], [-1, 2], [-1, -2]]
-        for idx, val in enumerate(knight_moves):
-            r_index = r_index_start + val[0]
-            f_index = f_index_start + val[1]
-           
-            if (f_index < 0 or r_index < 0 or f_index >= self.ncols or
-                r_index >= self.nrows):
-                continue
-
-            knight_check = self.squares[r_index][f_index].obstruct()
+        for sq in self.geometry.knight[self.geometry.index[move_code]]:
+            square = self.square_list[sq]
             if start_square:
-                if not knight_check:
-                    knight_list.append(self.squares[r_index][f_index].name)
-            else:
-                if not isinstance(knight_check, int):
-                    if knight_check.name == 'Knight':
-                        knight_list.append(knight_check)
+                if square.piece is None:
+                    knight_list.append(square.name)
+            elif square.piece is not None and square.piece.name == 'Knight':
+                knight_list.append(square.piece)
 
         return knight_list
 
     def pawn_extent(self, move_code, direct):
         move_list = []
+        info = DIRECTION_INFO[direct]
 
-        theta = np.radians(90*direct)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
-
-        #Arrays cover moving forward and capturing on either diagonal
+        #Vectors cover moving forward and capturing on either diagonal
         file_start, rank_start = move_to_rank_file(move_code)
         
-        forward = np.array([c,s])
-        diag_1 = np.array([c-s, s-c])
-        diag_2 = np.array([c+s, s+c])
-       
-        move_differ = [forward, 2*forward, diag_1, diag_2]
+        move_differ = [info['forward'], info['double'], info['diag_L'],
+                    info['diag_R']]
 
         for move in move_differ:
             rank_end = rank_start + move[0]
             file_end = file_start + move[1]
-            move_end = rank_file_to_move(file_end, rank_end)
-            if self.square_find(move_end).obstruct() != True:
-                move_list.append(move_end)
+            if not self.geometry.on_board(rank_end-1, file_end-1):
+                continue
+            move_list.append(rank_file_to_move(file_end, rank_end))
 
         return move_list
 
     #Checks if king is mated - 3 checks: if double check then king has to
     #move/capture something, if single check then either capture attacking
     #piece, king moves/captures or block line of site of piece
+    #King is mated if there is no move out of check, found with the first
+    #record the evasion generator yields
     def test_mate(self, king_checks, king_col):
-
-        #Checks if king can move/capture out of check
-        move_start = self.king_loc[king_col]
-        piece = self.square_find(move_start).piece
-        
-        file_, rank = move_to_rank_file(move_start)
-        
-        move_direct = [[-1, -1], [-1, 0], [-1, 1], [0, -1],
-                        [0, 1], [1, -1], [1, 0], [1, 1]]
-        
-        for idx, val in enumerate(move_direct):
-            f_index = file_ - 1 + val[0]
-            r_index = rank - 1 + val[1]
-            
-            if (f_index < 0 or f_index > self.ncols - 1 or
-                r_index < 0 or r_index > self.nrows - 1):
-                continue
-            move_end = self.squares[r_index][f_index].name
-            
-            if self.square_find(move_end).obstruct() == True:
-                continue
-
-            checked_checks = self.move(move_start, move_end, dummy = True) 
-            if checked_checks == False:
-                continue
-            if not king_col in checked_checks:
-                return False
-
-        #If double check (and king can't move) then king is mated
-        if len(king_checks) > 1:
-            return True
-       
-        #If resigned then only king remains so can't capture/obstruct
-        if self.square_find(self.king_loc[king_col]).piece.resigned:
-            return True
-
-        #Checks if a piece can capture the checking piece
-        move_end = king_checks[0].loc
-        att_pieces = (self.hori_verti_diag_extent(move_end) + 
-                    self.knight_extent(move_end))
-
-        for idx, piece in enumerate(att_pieces):
-            move_start = piece.loc
-            colour = piece.colour
-            if colour != king_col:
-                continue
-            checked_checks = self.move(move_start, move_end, dummy = True)
-            if checked_checks == False:
-                continue
-            if not king_col in checked_checks:
-                return False
-
-        #Checks if the checking piece can be obstructed (can't if knight so)
-        #mate in that case or if king is resigned so no pieces to obstruct
-   
-        if king_checks[0].name == 'Knight':
-            return True
-
-        king_f, king_r = move_to_rank_file(self.king_loc[king_col])
-        checker_f, checker_r = move_to_rank_file(move_end)
-
-        r_start = king_r - 1
-        f_start = king_f - 1
-
-        diff_f = checker_f - king_f
-        diff_r = checker_r - king_r
-
-        if diff_f > 0:
-            f_step = 1
-        elif diff_f == 0:
-            f_step = 0
-        elif diff_f < 0:
-            f_step = -1
-        if diff_r > 0:
-            r_step = 1
-        elif diff_r == 0:
-            r_step = 0
-        elif diff_r < 0:
-            r_step = -1
-
-        max_diff = max(abs(diff_f), abs(diff_r))
-
-        for i in range(1, max_diff):
-            r_index = r_start + i*r_step
-            f_index = f_start + i*f_step
-
-            square = self.squares[r_index][f_index]
-            
-            obstr_loc = square.name
-
-            obstr_pieces = (self.hori_verti_diag_extent(obstr_loc) + 
-                                self.knight_extent(obstr_loc))
-
-            for piece in obstr_pieces:
-                if piece.colour != king_col:
-                    continue
-                move_start = piece.loc
-                checked_checks = self.move(move_start, obstr_loc, dummy = True)
-                if checked_checks == False:
-                    continue
-                if not king_col in checked_checks:
-                    return False
-
-        return True
+        return next(self.evasion_moves(king_col, king_checks), None) is None
 
     def mate_apply(self, king_col):
         self.colours.remove(king_col)
+        self.key = self.key ^ self.zobrist.in_game[COLOUR_INFO.index(king_col)]
         del self.king_loc[king_col]
         for piece in self.piece_pos[king_col]:
             piece.dead = True
+        self.colour_recode(king_col)
+        self.ep_update()
 
     def mate_undo(self, king_col):
 
@@ -748,6 +729,7 @@ class Board:
                 self.colours.append(king_col)
                 stop = True
             i = i + 1
+        self.key = self.key ^ self.zobrist.in_game[king_idx]
         
         for piece in self.piece_pos[king_col]:
             if piece.name == 'King':
@@ -757,9 +739,12 @@ class Board:
             for piece in self.piece_pos[king_col]:
                 piece.dead = False
         self.king_loc[king_col] = king_piece.loc
+        self.colour_recode(king_col)
+        self.ep_update()
 
-    def resign_apply(self, move = True):
-        king_col = self.to_play
+    def resign_apply(self, move = True, king_col = None):
+        if king_col is None:
+            king_col = self.to_play
         self.resign_list.append(king_col)
         for piece in self.piece_pos[king_col]:
             piece.dead = True
@@ -767,112 +752,809 @@ class Board:
             if piece.name == 'King':
                 piece.dead = False
                 king_loc = piece.loc
+        self.colour_recode(king_col)
 
         if move:
-            self.king_random_move(king_loc, resign = True)
+            return self.king_random_move(king_loc, resign = True)
 
     def resign_undo(self, king_col):
         self.resign_list.remove(king_col)
         for piece in self.piece_pos[king_col]:
             piece.dead = False
             piece.resigned = False
+        self.colour_recode(king_col)
 
+    #Random quiet move of a resigned king. A king boxed in with no quiet move
+    #takes its colour out of the game instead (returning False)
     def king_random_move(self, king_loc, resign = False):
-        file_, rank = move_to_rank_file(king_loc)
-        
-        move_direct = [[-1, -1], [-1, 0], [-1, 1], [0, -1],
-                        [0, 1], [1, -1], [1, 0], [1, 1]]
+        king = self.square_find(king_loc).piece
+        rec = self.random_move(king.colour, piece = king, quiet = True)
+        if rec is None:
+            self.resign_eliminate(king.colour)
+            return False
+        king_att_end = self.move_code(rec)[1]
+        return self.move(king_loc, king_att_end, resign)
+
+    #Takes a resigned colour out of the game as if stalemated, passing its
+    #turn on to the next colour
+    def resign_eliminate(self, colour):
+        idx = self.colours.index(colour)
+        self.mate_apply(colour)
+        self.resign_list.remove(colour)
+        if self.to_play == colour:
+            self.to_play_set(self.colours[idx % len(self.colours)])
+        if self.game_over_check():
+            self.game_over = True
 
-        moves = []
-        for idx, val in enumerate(move_direct):
-            f_index = file_ - 1 + val[0]
-            r_index = rank - 1 + val[1]
-            
-            if (f_index < 0 or f_index > self.ncols - 1 or
-                r_index < 0 or r_index > self.nrows - 1):
+    #Random legal move of colour (or of piece only, without castling when
+    #quiet) or None if there is none. Pseudo-legal moves are drawn by rand
+    #without replacement until one passes legal_test, so a move usually
+    #costs one generation and a single test - fast enough for playouts
+    def random_move(self, colour, rand = random, piece = None, quiet = False):
+        if piece is None:
+            moves = list(self.pseudo_legal_moves(colour))
+        else:
+            moves = list(self.piece_moves(piece))
+        if quiet:
+            moves = [rec for rec in moves if rec.flag == QUIET]
+        while moves:
+            i = rand.randrange(len(moves))
+            rec = moves[i]
+            if self.legal_test(rec):
+                return rec
+            moves[i] = moves[-1]
+            moves.pop()
+        return None
+
+    #Colours left without any legal move are stalemated and removed - the
+    #colour that has just moved is only tested on its next turn
+    def stalemate_test(self, mover = None):
+        stale_col = []
+        for colour in list(self.colours):
+            if colour == mover:
+                continue
+            if not self.move_cache.has_moves(colour):
+                print('{} is stalemated'.format(colour))
+                self.mate_apply(colour)
+                stale_col.append(colour)
+        return stale_col
+
+    #Square index used by compact move records for a square code
+    def sq_index(self, square_code):
+        return self.geometry.index[square_code]
+
+    #Square codes of a compact move record as used by Board.move
+    def move_code(self, rec):
+        return (self.square_list[rec.start].name,
+                self.square_list[rec.end].name)
+
+    #Lazily yields compact records of every move colour can make without
+    #testing whether its own king is left in check. Captured, dead and
+    #resigned (non-king) pieces are skipped. Board must be unchanged between
+    #records being taken from the generator
+    def pseudo_legal_moves(self, colour):
+        for piece in self.piece_pos[colour]:
+            if piece.loc is None or piece.dead:
                 continue
-            move_end = self.squares[r_index][f_index].name
-            if self.squares[r_index][f_index].obstruct() == True:
+            yield from self.piece_moves(piece)
+
+    #Counts the leaf nodes of the legal move tree depth plies deep using
+    #make/unmake - moves on the last ply are counted without being made
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = list(self.legal_moves(self.to_play))
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for rec in moves:
+            self.make(rec)
+            nodes = nodes + self.perft(depth - 1)
+            self.unmake()
+        return nodes
+
+    #Leaf node counts below each legal move of the side to play, keyed by
+    #'start-end' square codes
+    def perft_divide(self, depth):
+        divide = {}
+        for rec in list(self.legal_moves(self.to_play)):
+            move_start, move_end = self.move_code(rec)
+            self.make(rec)
+            divide[move_start + '-' + move_end] = self.perft(depth - 1)
+            self.unmake()
+        return divide
+
+    #Legal moves of colour from the per-colour move cache - for stalemate
+    #tests, move hints and engines
+    def cached_moves(self, colour):
+        return self.move_cache.moves(colour)
+
+    #Legal moves of a single piece from the move cache
+    def piece_legal_moves(self, piece):
+        return self.move_cache.piece_moves(piece)
+
+    #Lazily yields moves of colour that do not leave its own king in check
+    def legal_moves(self, colour):
+        king_loc = self.king_loc.get(colour)
+        if king_loc is not None and self.square_attacked(colour,
+                self.geometry.index[king_loc]):
+            yield from self.evasion_moves(colour)
+            return
+        for rec in self.pseudo_legal_moves(colour):
+            if self.legal_test(rec):
+                yield rec
+
+    #Lazily yields the legal moves of colour while its king is in check by
+    #the pieces checkers (found with check_test if not given). The king may
+    #step to an unattacked square that is not behind it on a checking
+    #slider's line (the x-ray the attack maps cannot see). Other pieces may
+    #capture the checker or block the squares between when there is a single
+    #checker, and pinned pieces must stay on their pin line. En passant and
+    #captures of a checking colour's king (which remove that colour's pieces)
+    #are tried with make/unmake
+    def evasion_moves(self, colour, checkers = None):
+        king_loc = self.king_loc[colour]
+        if checkers is None:
+            checkers = self.check_test(colour, king_loc)
+        if not checkers:
+            for rec in self.pseudo_legal_moves(colour):
+                if self.legal_test(rec):
+                    yield rec
+            return
+
+        geometry = self.geometry
+        king_sq = geometry.index[king_loc]
+        king = self.square_list[king_sq].piece
+        checker_sqs = [geometry.index[piece.loc] for piece in checkers]
+
+        shadow = set()
+        king_caps = set()
+        for sq, piece in zip(checker_sqs, checkers):
+            if piece.name in ('Rook', 'Bishop', 'Queen'):
+                d = geometry.direction(sq, king_sq)
+                shadow.update(geometry.rays[king_sq][d][:1])
+            if piece.colour in self.king_loc:
+                king_caps.add(geometry.index[self.king_loc[piece.colour]])
+
+        for rec in self.piece_moves(king):
+            if rec.flag != QUIET or rec.end in shadow:
                 continue
-            moves.append(move_end)
+            target = self.square_list[rec.end].piece
+            if target is not None and target.name == 'King' and not target.dead:
+                if self.legal_test(rec):
+                    yield rec
+            elif not self.attack_maps.attacked(rec.end, king.direction):
+                yield rec
+
+        if len(checkers) == 1:
+            targets = set(geometry.between[king_sq].get(checker_sqs[0], ()))
+            targets.add(checker_sqs[0])
+        else:
+            targets = set()
+        pins = self.pins(colour)
 
-        stop = False
-        while not stop:
-            king_att_end = random.choice(moves)
-            move_check = self.move(king_loc, king_att_end, dummy = True)
-            if move_check == False:
-                moves.remove(king_att_end)
-            elif self.to_play in move_check:
-                moves.remove(king_att_end)
+        for piece in self.piece_pos[colour]:
+            if piece.loc is None or piece.dead or piece is king:
+                continue
+            for rec in self.piece_moves(piece):
+                if rec.end in king_caps or rec.flag & ENPASSANT:
+                    if self.legal_test(rec):
+                        yield rec
+                elif rec.end in targets:
+                    if rec.start not in pins or rec.end in pins[rec.start]:
+                        yield rec
+
+    #Pieces of colour pinned to its king - pins[sq] is the set of squares
+    #the piece on sq may move to, the line from the king up to and
+    #including the live enemy slider pinning it
+    def pins(self, colour):
+        pins = {}
+        king_loc = self.king_loc.get(colour)
+        if king_loc is None:
+            return pins
+        cidx = COLOUR_INFO.index(colour)
+        mailbox = self.mailbox
+        king_sq = self.geometry.index[king_loc]
+        for d, ray in enumerate(self.geometry.rays[king_sq]):
+            pinned = None
+            for i, sq in enumerate(ray):
+                code = mailbox.get(sq)
+                if code == EMPTY:
+                    continue
+                if pinned is None:
+                    if code & DEAD_BIT or code_colour(code) != cidx:
+                        break
+                    pinned = sq
+                    continue
+                if (not code & DEAD_BIT and code_colour(code) != cidx and
+                        d in SLIDER_DIRECTIONS.get(code & TYPE_MASK, ())):
+                    pins[pinned] = frozenset(ray[:i + 1])
+                break
+        return pins
+
+    #Pseudo-legal moves of a single piece on the board
+    def piece_moves(self, piece):
+        start = self.geometry.index[piece.loc]
+        if piece.name == 'Pawn':
+            yield from self.pawn_moves(piece, start)
+        elif piece.name == 'Knight':
+            yield from self.step_moves(piece, start, self.geometry.knight[start])
+        elif piece.name == 'King':
+            yield from self.step_moves(piece, start, self.geometry.king[start])
+            yield from self.castle_moves(piece, start)
+        elif piece.name == 'Rook':
+            yield from self.slider_moves(piece, start, HORI)
+        elif piece.name == 'Bishop':
+            yield from self.slider_moves(piece, start, DIAG)
+        else:
+            yield from self.slider_moves(piece, start, range(8))
+
+    #True if a pseudo-legal move does not leave the mover's king in check.
+    #With the king not attacked a king step only needs its end square free
+    #of attacks and any other piece can only expose the king along the line
+    #from the king through its start square, anything else (and captures of
+    #a king, which take out its colour's pieces) is tried with make/unmake
+    def legal_test(self, rec):
+        piece = self.square_list[rec.start].piece
+        colour = piece.colour
+        if rec.flag & (KING_CASTLE | QUEEN_CASTLE):
+            if not self.castle_safe(colour, rec):
+                return False
+        king_loc = self.king_loc.get(colour)
+        if king_loc is not None and not rec.flag & (ENPASSANT | KING_CASTLE
+                | QUEEN_CASTLE):
+            king_sq = self.geometry.index[king_loc]
+            if not self.attack_maps.attacked(king_sq, piece.direction):
+                if piece.name == 'King':
+                    target = self.square_list[rec.end].piece
+                    if target is None or target.name != 'King' or target.dead:
+                        return not self.attack_maps.attacked(rec.end,
+                                piece.direction)
+                else:
+                    d = self.geometry.direction(king_sq, rec.start)
+                    if d is None:
+                        return True
+                    target = self.square_list[rec.end].piece
+                    if target is None or target.name != 'King' or target.dead:
+                        return not self.line_exposed(king_sq, d, rec,
+                                piece.direction)
+        self.move_cache.hold = self.move_cache.hold + 1
+        self.make(rec)
+        king_loc = self.king_loc.get(colour)
+        in_check = king_loc is not None and self.attack_maps.scan(
+                self.geometry.index[king_loc], piece.direction)
+        self.unmake()
+        self.move_cache.hold = self.move_cache.hold - 1
+        return not in_check
+
+    #True if square sq is attacked by a live piece of a colour other than
+    #colour - a lookup in the incrementally kept attack maps
+    def square_attacked(self, colour, sq):
+        return self.attack_maps.attacked(sq, COLOUR_INFO.index(colour))
+
+    #True if rec leaves a live slider of another colour than cidx looking at
+    #king_sq along direction d - the start square is passed over as empty
+    #and the end square blocks
+    def line_exposed(self, king_sq, d, rec, cidx):
+        mailbox = self.mailbox
+        cells = mailbox.cells
+        offset = mailbox.offsets[d]
+        start = mailbox.pad_index[rec.start]
+        end = mailbox.pad_index[rec.end]
+        cell = mailbox.pad_index[king_sq] + offset
+        while cell != end and (cell == start or cells[cell] == EMPTY):
+            cell = cell + offset
+        code = cells[cell]
+        if (cell == end or code <= 0 or code & DEAD_BIT or
+                code_colour(code) == cidx):
+            return False
+        return d in SLIDER_DIRECTIONS.get(code & TYPE_MASK, ())
+
+    #Static exchange evaluation of a capture - the mover's points won less
+    #material lost once the capture sequence on the end square has played
+    #out. Every colour in turn order after the last capture may recapture
+    #with its least valuable attacker (a pinned piece only along its pin, a
+    #king only when no other colour still attacks the square) and does so
+    #when that leaves it better off than letting the sequence go on. Pieces
+    #behind a capturer on its line join in as it leaves. Captures of dead
+    #pieces and kings, and by resigned colours, win no points as in
+    #score_update
+    def see(self, rec):
+        mover = self.square_list[rec.start].piece
+        if rec.flag & ENPASSANT:
+            gain = PIECE_INFO['Pawn']['value']
+        else:
+            gain = self.see_value(self.square_list[rec.end].piece, mover)
+        chains, knights = self.see_attackers(rec.end)
+        for chain in chains:
+            if chain and chain[0] is mover:
+                chain.pop(0)
+        if mover in knights:
+            knights.remove(mover)
+        state = (rec.end, chains, knights, {})
+        return gain + self.see_turn(state, mover, 0)[mover.direction]
+
+    #Points won by capturer taking piece
+    def see_value(self, piece, capturer):
+        if (piece is None or piece.dead or piece.resigned or
+                piece.name == 'King' or capturer.resigned or
+                piece.colour == capturer.colour):
+            return 0
+        return piece.value
+
+    #Live pieces attacking sq - per ray the pieces in line from sq that
+    #attack it once those in front have gone (first piece may be a pawn or
+    #king next to sq) and the knights
+    def see_attackers(self, sq):
+        mailbox = self.mailbox
+        chains = []
+        for d, ray in enumerate(self.geometry.rays[sq]):
+            chain = []
+            for i, ray_sq in enumerate(ray):
+                code = mailbox.get(ray_sq)
+                if code == EMPTY:
+                    continue
+                if code & DEAD_BIT:
+                    break
+                kind = code & TYPE_MASK
+                if d in SLIDER_DIRECTIONS.get(kind, ()):
+                    chain.append(self.square_list[ray_sq].piece)
+                elif i == 0 and (kind == TYPE_CODES['King'] or
+                        (kind == TYPE_CODES['Pawn'] and sq in
+                        self.attack_maps.pawn_targets[code_colour(code)][ray_sq])):
+                    chain.append(self.square_list[ray_sq].piece)
+                else:
+                    break
+            if chain:
+                chains.append(chain)
+        knights = []
+        for knight_sq in self.geometry.knight[sq]:
+            code = mailbox.get(knight_sq)
+            if code > 0 and not code & DEAD_BIT and code & TYPE_MASK == \
+                    TYPE_CODES['Knight']:
+                knights.append(self.square_list[knight_sq].piece)
+        return chains, knights
+
+    #Gain per colour index of the rest of the sequence with occupant on the
+    #square, from the turn-th colour after occupant's
+    def see_turn(self, state, occupant, turn):
+        colours = self.colours
+        k = colours.index(occupant.colour) if occupant.colour in colours else -1
+        if turn >= len(colours) - 1:
+            return [0, 0, 0, 0]
+        colour = colours[(k + 1 + turn) % len(colours)]
+        passed = self.see_turn(state, occupant, turn + 1)
+        if colour == occupant.colour or colour in self.resign_list:
+            return passed
+        attacker = self.see_cheapest(state, colour)
+        if attacker is None:
+            return passed
+        piece, chain = attacker
+        chain.remove(piece)
+        captured = self.see_turn(state, piece, 0)
+        chain.insert(0, piece)
+        cidx = piece.direction
+        captured[cidx] = captured[cidx] + self.see_value(occupant, piece)
+        captured[occupant.direction] = (captured[occupant.direction] -
+                occupant.value)
+        return captured if captured[cidx] > passed[cidx] else passed
+
+    #(piece, list it is taken from) of the least valuable piece of colour
+    #that may capture on the square now, or None. Pins are found the first
+    #time a colour is looked at
+    def see_cheapest(self, state, colour):
+        sq, chains, knights, pins = state
+        best = None
+        for chain in chains + [knights]:
+            for piece in (chain[:1] if chain is not knights else chain):
+                if piece.colour != colour:
+                    continue
+                if colour not in pins:
+                    pins[colour] = self.pins(colour)
+                pin = pins[colour].get(self.geometry.index[piece.loc])
+                if pin is not None and sq not in pin:
+                    continue
+                if best is None or piece.value < best[0].value or (
+                        best[0].name == 'King'):
+                    best = (piece, chain)
+        if best is not None and best[0].name == 'King':
+            for chain in chains + [knights]:
+                if any(piece.colour != colour for piece in chain):
+                    return None
+        return best
+
+    #Live pieces of colour that another colour can win by a legal capture
+    #with a positive static exchange
+    def hanging_pieces(self, colour):
+        hanging = []
+        for other in self.colours:
+            if other == colour or other in self.resign_list:
+                continue
+            for rec in self.pseudo_legal_moves(other):
+                target = self.square_list[rec.end].piece
+                if (target is not None and target.colour == colour and
+                        not target.dead and target not in hanging and
+                        self.legal_test(rec) and self.see(rec) > 0):
+                    hanging.append(target)
+        return hanging
+
+    #Tests whether the piece on move_start has a legal move to move_end
+    def probe_move(self, move_start, move_end):
+        piece = self.square_find(move_start).piece
+        if piece is None:
+            return False
+        end = self.sq_index(move_end)
+        for rec in self.piece_moves(piece):
+            if rec.end == end:
+                return self.legal_test(rec)
+        return False
+
+    #Moves for rook/bishop/queen stepping mailbox cells in each direction
+    #until the OFFBOARD padding, a blocked square or a piece is reached
+    def slider_moves(self, piece, start, directions):
+        cells = self.mailbox.cells
+        cell_sq = self.mailbox.cell_sq
+        offsets = self.mailbox.offsets
+        cidx = piece.direction
+        for d in directions:
+            offset = offsets[d]
+            cell = self.mailbox.pad_index[start] + offset
+            code = cells[cell]
+            while code == EMPTY:
+                yield MoveRec(start, cell_sq[cell], QUIET)
+                cell = cell + offset
+                code = cells[cell]
+            if code_free(code, cidx):
+                yield MoveRec(start, cell_sq[cell], QUIET)
+
+    #Moves for knight/king onto precomputed target squares
+    def step_moves(self, piece, start, targets):
+        cells = self.mailbox.cells
+        pad_index = self.mailbox.pad_index
+        cidx = piece.direction
+        for sq in targets:
+            if code_free(cells[pad_index[sq]], cidx):
+                yield MoveRec(start, sq, QUIET)
+
+    def pawn_moves(self, piece, start):
+        forward, double, diag_L, diag_R = self.pawn_steps[piece.direction][start]
+        prom_squares = self.prom_squares[piece.direction]
+        mailbox = self.mailbox
+
+        #Single and double pushes need empty squares ahead
+        if forward is not None and mailbox.get(forward) == EMPTY:
+            if forward in prom_squares:
+                yield MoveRec(start, forward, PROMOTION)
             else:
-                self.move(king_loc, king_att_end, resign)
-                stop = True
+                yield MoveRec(start, forward, QUIET)
+            if (double is not None and not piece.last_move and
+                    mailbox.get(double) == EMPTY):
+                if double in prom_squares:
+                    yield MoveRec(start, double, PROMOTION)
+                else:
+                    yield MoveRec(start, double, DOUBLE_PUSH)
 
-    def stalemate_test(self):
-        #Knight_extent -> all knight moves
-        #Hori_verti_diag_extent -> all rook/bishop/queen moves
-        #King_extent -> trivial 
-        #Need to write something for pawns extent
-        
-        stale_col = []
-        for colour in self.colours:
-            stop = False
-            for piece in self.piece_pos[colour]:
-                if piece.loc == None:
+        #Diagonal captures or en passant if the diagonal square is empty
+        for diag in (diag_L, diag_R):
+            if diag is None:
+                continue
+            code = mailbox.get(diag)
+            flag = QUIET
+            if code == EMPTY:
+                if not self.enpassant_test(piece, start, self.square_list[diag]):
                     continue
-                if stop:
+                flag = ENPASSANT
+            elif not code_free(code, piece.direction):
+                continue
+            if diag in prom_squares:
+                flag = flag | PROMOTION
+            yield MoveRec(start, diag, flag)
+
+    #En passant test using Move.enpassant_check plus the requirement that
+    #the double push happened within the last round of moves
+    def enpassant_test(self, piece, start, end_square):
+        forward = self.pawn_steps[piece.direction][start][0]
+        if forward is None:
+            return False
+        front = self.square_list[forward].piece
+        if (front is None or front.name != 'Pawn' or not front.last_move or
+                not front.last_move.double_push):
+            return False
+        if self.total_moves + 1 - front.last_move.total_number > len(
+                self.colours):
+            return False
+
+        info = DIRECTION_INFO[piece.direction]
+        attempt_move = Move(0, piece.colour, piece.loc, end_square.name)
+        rf_diff = (attempt_move.r_diff(), attempt_move.f_diff())
+        return attempt_move.enpassant_check(info['forward'], info['diag_L'],
+                info['diag_R'], rf_diff, piece, self.squares)
+
+    #Castling moves allowed by castling rights and an empty path to the
+    #rook - safety of the squares passed is tested by castle_safe
+    def castle_moves(self, piece, start):
+        info = DIRECTION_INFO[piece.direction]
+        r_start, f_start = divmod(start, self.ncols)
+        castles = [[self.king_castle[piece.colour], 'King', KING_CASTLE],
+                [self.queen_castle[piece.colour], 'Queen', QUEEN_CASTLE]]
+
+        for rights, castle_type, flag in castles:
+            if rights != 1:
+                continue
+            r_step, f_step = info['castle'][castle_type]
+            square_dist = info['castle_dist'][castle_type]
+            for i in range(1, square_dist + 1):
+                r_index, f_index = r_start + i*r_step, f_start + i*f_step
+                if not self.geometry.on_board(r_index, f_index):
+                    break
+                if self.mailbox.get(r_index*self.ncols + f_index) == EMPTY:
                     continue
+                if i == square_dist:
+                    end = (r_start + 2*r_step)*self.ncols + f_start + 2*f_step
+                    yield MoveRec(start, end, flag)
+                break
+
+    #King may not castle out of or through check
+    def castle_safe(self, colour, rec):
+        r_start, f_start = divmod(rec.start, self.ncols)
+        r_end, f_end = divmod(rec.end, self.ncols)
+        r_step, f_step = (r_end - r_start)//2, (f_end - f_start)//2
+        for i in range(2):
+            sq = (r_start + i*r_step)*self.ncols + f_start + i*f_step
+            if self.square_attacked(colour, sq):
+                return False
+        return True
 
-                pos = piece.loc
-
-                if piece.name == 'Rook':
-                    moves = self.hori_verti_diag_extent(pos, 
-                            extent_type = 'hori', include_gap = True)
-                    
-                elif piece.name == 'Queen':
-                    moves = self.hori_verti_diag_extent(pos,
-                            extent_type = 'all', include_gap = True)
-
-                elif piece.name == 'King':
-                    file_, rank = move_to_rank_file(pos)
-                    
-                    move_direct = [[-1, -1], [-1, 0], [-1, 1], [0, -1],
-                                    [0, 1], [1, -1], [1, 0], [1, 1]]
-
-                    moves = []
-                    for idx, val in enumerate(move_direct):
-                        f_index = file_ - 1 + val[0]
-                        r_index = rank - 1 + val[1]
-                        
-                        if (f_index < 0 or f_index > self.ncols - 1 or
-                            r_index < 0 or r_index > self.nrows - 1):
-                            continue
-                        move_end = self.squares[r_index][f_index].name
-                        if self.squares[r_index][f_index].obstruct() == True:
-                            continue
-                        moves.append(move_end)
-
-                elif piece.name == 'Pawn':
-                    moves = self.pawn_extent(pos, piece.direction)
-                elif piece.name == 'Bishop':
-                    moves = self.hori_verti_diag_extent(pos,
-                            extent_type = 'diag', include_gap = True)
-
-                elif piece.name == 'Knight':
-                    moves = self.knight_extent(pos, start_square = True)
-
-                for move_end in moves:
-                    move_test = self.move(pos, move_end, dummy = True)
-                    if move_test == False:
-                        continue
-                    if not colour in move_test:
-                        stop = True
-            
-            if not stop:
-                print('{} is stalemated'.format(colour))
-                self.mate_apply()
-                stale_col.append(colour)
-        return stale_col
+    #Applies a generated move with no scoring, PGN or check testing and
+    #pushes an Undo record so it can be reversed by unmake
+    def make(self, rec):
+        start_square = self.square_list[rec.start]
+        end_square = self.square_list[rec.end]
+        piece = start_square.piece
+        old_piece = end_square.piece
+        colour = piece.colour
+
+        undo = Undo(rec, piece, old_piece, self)
+        undo.double_push = bool(rec.flag & DOUBLE_PUSH)
+        self.total_moves = self.total_moves + 1
+        undo.total_number = self.total_moves
+
+        if rec.flag & PROMOTION:
+            piece.name = 'Queen'
+            piece.promoted = True
+
+        if old_piece is not None:
+            old_piece.loc = None
+        end_square.add_piece(piece)
+        start_square.remove_piece()
+        piece.last_move = undo
+        if undo.double_push:
+            self.ep_pushes.append((piece, undo.total_number))
+
+        if rec.flag & ENPASSANT:
+            forward = self.pawn_steps[piece.direction][rec.start][0]
+            undo.enp_square = self.square_list[forward]
+            undo.enp_piece = undo.enp_square.piece
+            undo.enp_piece.loc = None
+            undo.enp_square.remove_piece()
+
+        if piece.name == 'King':
+            self.king_loc[colour] = end_square.name
+            self.castle_set(colour, 'King', 0)
+            self.castle_set(colour, 'Queen', 0)
+            if rec.flag & (KING_CASTLE | QUEEN_CASTLE):
+                castle_type = 'King' if rec.flag & KING_CASTLE else 'Queen'
+                rook_start, rook_end = piece.rook_square(castle_type)
+                undo.castle_rook = [self.square_find(rook_start),
+                        self.square_find(rook_end)]
+                undo.castle_rook[1].add_piece(undo.castle_rook[0].piece)
+                undo.castle_rook[0].remove_piece()
+        elif piece.name == 'Rook' and colour in self.king_loc:
+            self.castle_rights_clear(piece, start_square.name)
+
+        if old_piece is not None and not old_piece.dead:
+            if old_piece.name == 'Rook' and old_piece.colour in self.king_loc:
+                self.castle_rights_clear(old_piece, end_square.name)
+            elif old_piece.name == 'King':
+                undo.eliminated = old_piece.colour
+                undo.dead_pieces = [pce for pce in
+                        self.piece_pos[old_piece.colour] if not pce.dead]
+                self.colours.remove(old_piece.colour)
+                self.key = self.key ^ self.zobrist.in_game[
+                        old_piece.direction]
+                del self.king_loc[old_piece.colour]
+                for pce in undo.dead_pieces:
+                    pce.dead = True
+                self.colour_recode(undo.eliminated)
+
+        if (old_piece is not None or undo.enp_piece is not None or
+                rec.flag & PROMOTION or piece.name == 'Pawn'):
+            self.half_moves[0] = 0
+        elif self.half_moves[1] != len(self.colours):
+            self.half_moves[0] = 0
+            self.half_moves[1] = len(self.colours)
+        else:
+            self.half_moves[0] = self.half_moves[0] + 1
+
+        col_idx = (self.colours.index(colour) + 1) % len(self.colours)
+        self.to_play_set(self.colours[col_idx])
+        self.ep_update()
+
+        self.undo_stack.append(undo)
+
+    #Reverses the last move applied by make
+    def unmake(self):
+        undo = self.undo_stack.pop()
+        rec = undo.rec
+        piece = undo.piece
+        start_square = self.square_list[rec.start]
+        end_square = self.square_list[rec.end]
+
+        if undo.eliminated:
+            for pce in undo.dead_pieces:
+                pce.dead = False
+            self.colour_recode(undo.eliminated)
+        self.colours[:] = undo.colours
+        self.king_loc.update(undo.king_loc)
+        self.king_castle.update(undo.king_castle)
+        self.queen_castle.update(undo.queen_castle)
+        self.half_moves[0], self.half_moves[1] = undo.half_moves
+        self.to_play = undo.to_play
+        self.total_moves = self.total_moves - 1
+
+        if undo.castle_rook:
+            undo.castle_rook[0].add_piece(undo.castle_rook[1].piece)
+            undo.castle_rook[1].remove_piece()
+
+        if rec.flag & PROMOTION:
+            piece.name = 'Pawn'
+            piece.promoted = False
+
+        start_square.add_piece(piece)
+        if undo.old_piece is None:
+            end_square.remove_piece()
+        else:
+            end_square.add_piece(undo.old_piece)
+        piece.last_move = undo.last_move
+
+        if undo.enp_piece is not None:
+            undo.enp_square.add_piece(undo.enp_piece)
+
+        #Every square is back as it was, so the key is too
+        if undo.double_push:
+            self.ep_pushes.pop()
+        self.key = undo.key
+        self.ep_key = undo.ep_key
+
+    #Removes castling rights on the side of a rook that moves or is captured
+    def castle_rights_clear(self, rook, rook_loc):
+        rook_type = rook.rook_type(self.king_loc[rook.colour], rook_loc)
+        if rook_type in ('King', 'Queen'):
+            self.castle_set(rook.colour, rook_type, 0)
+
+    #Sets the castling right of colour on side ('King' or 'Queen') to value,
+    #keeping the key in step
+    def castle_set(self, colour, side, value):
+        if side == 'King':
+            rights, keys = self.king_castle, self.zobrist.king_castle
+        else:
+            rights, keys = self.queen_castle, self.zobrist.queen_castle
+        if (rights[colour] == 1) != (value == 1):
+            self.key = self.key ^ keys[COLOUR_INFO.index(colour)]
+        rights[colour] = value
+
+    #Passes the turn to colour, keeping the key in step
+    def to_play_set(self, colour):
+        keys = self.zobrist.to_play
+        self.key = (self.key ^ keys[COLOUR_INFO.index(self.to_play)] ^
+                keys[COLOUR_INFO.index(colour)])
+        self.to_play = colour
+
+    #Swaps the en passant part of the key for that of the pawns still open
+    #to en passant - only the last double pushes need looking at, as those
+    #more than a round of moves old have expired
+    def ep_update(self):
+        ep_key = 0
+        for piece, number in reversed(self.ep_pushes):
+            if self.total_moves + 1 - number > len(self.colours):
+                break
+            if (piece.loc is not None and piece.name == 'Pawn' and
+                    piece.last_move.double_push and
+                    piece.last_move.total_number == number and
+                    piece.colour in self.colours):
+                ep_key = ep_key ^ self.zobrist.ep[
+                        self.geometry.index[piece.loc]]
+        self.key = self.key ^ self.ep_key ^ ep_key
+        self.ep_key = ep_key
+
+    #Sets the key from scratch once a position has been set up
+    def key_reset(self):
+        self.ep_update()
+        self.key = self.hash_recompute()
+
+    #Keeps the mailbox in step with a square whose piece has changed. While
+    #legal_test has its probe move on the board (move_cache.hold) only the
+    #cells its check test reads are kept - the probe is taken
+    #back at once and unmake restores the key, so the attack maps, key and
+    #evaluation are left as they were
+    def square_update(self, square):
+        mailbox = self.mailbox
+        cell = mailbox.pad_index[square.idx]
+        code = piece_code(square.piece)
+        old_code = mailbox.cells[cell]
+        if self.move_cache.hold:
+            mailbox.cells[cell] = code
+            return
+        self.attack_maps.update(square.idx, old_code, code)
+        self.move_cache.square_changed(square.idx)
+        piece_keys = self.zobrist.piece[square.idx]
+        self.key = self.key ^ piece_keys[old_code] ^ piece_keys[code]
+        values = self.evaluator.square_values[square.idx]
+        if old_code:
+            cidx = code_colour(old_code)
+            self.eval_scores[cidx] = self.eval_scores[cidx] - values[old_code]
+        if code:
+            cidx = code_colour(code)
+            self.eval_scores[cidx] = self.eval_scores[cidx] + values[code]
+        mailbox.cells[cell] = code
+
+    #Re-encodes the pieces of a colour after their dead/resigned state changes
+    def colour_recode(self, colour):
+        for piece in self.piece_pos[colour]:
+            if piece.loc is not None:
+                self.square_update(self.square_find(piece.loc))
+
+    #64-bit Zobrist key of the position, kept up to date as it changes - the
+    #piece/square part by square_update so every way of moving pieces
+    #(make/unmake, board_move, temp_move_apply, castle_move) maintains it,
+    #the side to move, castling rights and colours in the game by
+    #to_play_set, castle_set and the places colours leave or rejoin the game
+    #and the en passant pawns by ep_update
+    def hash(self):
+        return self.key
+
+    #Material and piece-square score per colour index from the running
+    #totals - O(1) for search nodes
+    def evaluation(self):
+        if self.eval_debug:
+            full = self.eval_recompute()
+            assert self.eval_scores == full, (
+                    'evaluation {} differs from recompute {}'.format(
+                    self.eval_scores, full))
+        return self.eval_scores
+
+    def eval_recompute(self):
+        return self.evaluator.board_scores(self).tolist()
+
+    #Key recomputed from the squares and state for checking the incremental
+    #key
+    def hash_recompute(self):
+        key = 0
+        for square in self.square_list:
+            key = key ^ self.zobrist.piece[square.idx][piece_code(square.piece)]
+        return key ^ self.state_key()
+
+    def state_key(self):
+        zobrist = self.zobrist
+        key = zobrist.to_play[COLOUR_INFO.index(self.to_play)]
+        for cidx, colour in enumerate(COLOUR_INFO):
+            if self.king_castle.get(colour) == 1:
+                key = key ^ zobrist.king_castle[cidx]
+            if self.queen_castle.get(colour) == 1:
+                key = key ^ zobrist.queen_castle[cidx]
+        for colour in self.colours:
+            key = key ^ zobrist.in_game[COLOUR_INFO.index(colour)]
+            for piece in self.piece_pos[colour]:
+                if (piece.name == 'Pawn' and piece.loc is not None and
+                        piece.last_move and piece.last_move.double_push and
+                        self.total_moves + 1 - piece.last_move.total_number
+                        <= len(self.colours)):
+                    key = key ^ zobrist.ep[self.geometry.index[piece.loc]]
+        return key
+
+    #Zero-copy int8 NumPy view of the board cells indexed [rank-1][file-1]
+    def mailbox_view(self):
+        return self.mailbox.board_view()
 
     #Add piece to a square and updates data on king locations
     def piece_add(self, square, piece):
@@ -952,7 +1634,7 @@ class Board:
                     if empty_count > 0:
                         row_info.append(str(empty_count))
                         empty_count = 0
-                    row_info.append(piece.fen)
+                    row_info.append(piece.fen_code())
             if empty_count > 0:
                 row_info.append(str(empty_count))
             fen_string = fen_string + ','.join(str(x) for x in row_info) + '/\n'
@@ -965,32 +1647,67 @@ class Board:
 
         letter_to_clr = {'R': 'Red', 'B': 'Blue', 'Y': 'Yellow', 'G': 'Green'}
 
-        self.to_play = letter_to_clr[fen_list[0]]
         in_game = [int(x) for x in fen_list[1].split(',')] 
         king_castle = [int(x) for x in fen_list[2].split(',')]
         queen_castle = [int(x) for x in fen_list[3].split(',')]
         scores = [int(x) for x in fen_list[4].split(',')]
 
+        #Pieces are placed first as piece_fen_init resets the colour data
+        self.piece_fen_init(fen_list[6])
+        self.move_list = []
+        self.undo_stack = []
+        self.resign_list = []
+        self.total_moves = 0
+        self.game_over = False
+
+        #Pieces of colours out of the game are dead
+        self.colours = []
         for idx, clr in enumerate(COLOUR_INFO):
             if in_game[idx] == 1:
                 self.colours.append(clr)
+            else:
+                for piece in self.piece_pos[clr]:
+                    piece.dead = True
+                self.king_loc.pop(clr, None)
+                self.colour_recode(clr)
             self.king_castle[clr] = king_castle[idx]
             self.queen_castle[clr] = queen_castle[idx]
             self.scores[clr] = scores[idx]
 
+        self.to_play = letter_to_clr[fen_list[0]]
         self.half_moves = [int(fen_list[5]), len(self.colours)]
-        self.piece_fen_init(fen_list[6])
+        self.move_cache.clear()
+        self.ep_pushes = []
+        self.key_reset()
+
+    #PGN4 move text of the game, as saved by Display.comm_pgn_save
+    def moves_pgn(self):
+        moves_str = ''
+
+        old_num = 0
+        for move in self.move_list:
+            if move.number == old_num:
+                moves_str += ' .. '
+            else:
+                moves_str += '\n' + str(move.number) + '. '
+
+            moves_str += move.pgn
 
+            old_num = move.number
+
+        return moves_str
+
+    #FEN of the position in the format read by fen_to_board
     def board_to_fen(self):
         in_game = []
         king_castle = []
         queen_castle = []
         scores = []
-        
+
         clr_to_letter = {'Red': 'R', 'Blue': 'B', 'Yellow': 'Y', 'Green': 'G'}
 
-        for idx, clr in enumerate(COLOUR_INFO):
-            if self.colours[idx] in COLOUR_INFO:
+        for clr in COLOUR_INFO:
+            if clr in self.colours:
                 in_game.append(1)
             else:
                 in_game.append(0)
@@ -998,28 +1715,65 @@ class Board:
             queen_castle.append(self.queen_castle[clr])
             scores.append(self.scores[clr])
 
-        fen_list = (clr_to_letter[self.to_play] + '-' + ','.join(in_game) + '-' +
-                ','.join(king_castle) + '-' + ','.join(queen_castle) + '-' + 
-                ','.join(scores) + '-' + ','.join(half_moves) + '-\n')
-        
-        for i in range(self.nrows):
-            row_list = []
-            counter = 0
-            for j in range(self.ncols):
-                piece = self.squares[i][j].piece
-                if not piece:
-                    counter = counter + 1
-                else:
-                    row_list.append(counter)
-                    counter = 0
-                    text = clr_to_letter[piece.colour] + piece.name[0]
-                    row_list.append(text)
-            if counter > 0:
-                row_list.append(counter)
-            fen_list + ','.join(row_list) + '/\n'
-        fen_list = fen_list[:-3]
-
-        return fen_list
+        fen = (clr_to_letter[self.to_play] + '-' +
+                ','.join(str(x) for x in in_game) + '-' +
+                ','.join(str(x) for x in king_castle) + '-' +
+                ','.join(str(x) for x in queen_castle) + '-' +
+                ','.join(str(x) for x in scores) + '-' +
+                str(self.half_moves[0]) + '-\n')
+
+        return fen + self.board_pos_fen()
+
+    #Compact picklable state of the position - the FEN plus what it leaves
+    #out, the resigned colours (resign_list then those since taken out of
+    #the game) and the pawns open to en passant (square index, moves since
+    #their double push) and the squares of promoted pieces - for shipping a
+    #position to another process without the Square/Piece objects
+    def board_to_state(self):
+        resigned = list(self.resign_list)
+        for colour in COLOUR_INFO:
+            if colour not in self.colours and any(piece.resigned
+                    for piece in self.piece_pos[colour]):
+                resigned.append(colour)
+        enpassant = []
+        for colour in self.colours:
+            for piece in self.piece_pos[colour]:
+                if (piece.name == 'Pawn' and piece.loc is not None and
+                        piece.last_move and piece.last_move.double_push and
+                        self.total_moves + 1 - piece.last_move.total_number
+                        <= len(self.colours)):
+                    enpassant.append((self.geometry.index[piece.loc],
+                            self.total_moves - piece.last_move.total_number))
+        promoted = []
+        for colour in COLOUR_INFO:
+            for piece in self.piece_pos[colour]:
+                if piece.loc is not None and piece.promoted:
+                    promoted.append(self.geometry.index[piece.loc])
+        return (self.board_to_fen(), tuple(resigned), tuple(enpassant),
+                tuple(promoted))
+
+    #Sets up the position of a board_to_state state. The move history is not
+    #kept, so the position cannot be unmade past this point
+    def state_to_board(self, state):
+        fen, resigned, enpassant, promoted = state
+        self.fen_to_board(fen)
+        #Promoted pieces are still worth a pawn when captured
+        for sq in promoted:
+            piece = self.square_list[sq].piece
+            piece.promoted = True
+            piece.value = PIECE_INFO['Pawn']['value']
+        for colour in resigned:
+            if colour in self.colours:
+                self.resign_apply(move = False, king_col = colour)
+            else:
+                for piece in self.piece_pos[colour]:
+                    piece.resigned = True
+                self.colour_recode(colour)
+        for sq, moves_since in sorted(enpassant, key = lambda item: -item[1]):
+            piece = self.square_list[sq].piece
+            piece.last_move = LastMove(True, self.total_moves - moves_since)
+            self.ep_pushes.append((piece, piece.last_move.total_number))
+        self.ep_update()
 
     def temp_move_apply(self, move, direction):
 
@@ -1082,10 +1836,8 @@ class Board:
             if old_piece.name == 'Rook':
                 rook_type = old_piece.rook_type(self.king_loc[old_piece.colour],
                         move.start)
-                if rook_type == 'King':
-                    self.king_castle[old_piece.colour] = 0
-                elif rook_type == 'Queen':
-                    self.queen_castle[old_piece.colour] = 0
+                if rook_type in ('King', 'Queen'):
+                    self.castle_set(old_piece.colour, rook_type, 0)
         
         elif old_piece and direction == -1:
             start_square.add_piece(old_piece)
@@ -1106,25 +1858,31 @@ class Board:
             elif direction == -1:
                 self.resign_undo(colour)
         end_square.piece.last_move = move
+        #A pawn taken back past its double push has not moved before it
+        if move.double_push:
+            if direction == 1:
+                self.ep_pushes.append((end_square.piece, move.total_number))
+            elif direction == -1:
+                self.ep_pushes.pop()
+                end_square.piece.last_move = False
        
         if direction == 1:
             col_idx = (self.colours.index(colour) + 1)% (len(self.colours))
         elif direction == -1:
             col_idx = (self.colours.index(colour)) % (len(self.colours))
         
-        self.to_play = self.colours[col_idx]
+        self.to_play_set(self.colours[col_idx])
 
         if piece_start.name == 'King':
             if direction == 1:
-                self.king_castle[colour] = 0
-                self.queen_castle[colour] = 0
+                self.castle_set(colour, 'King', 0)
+                self.castle_set(colour, 'Queen', 0)
 
         elif piece_start.name == 'Rook':
             rook_type = piece_start.rook_type(self.king_loc[colour])
-            if rook_type == 'King':
-                self.king_castle[colour] = 0
-            elif rook_type == 'Queen':
-                self.queen_castle[colour] = 0
+            if rook_type in ('King', 'Queen'):
+                self.castle_set(colour, rook_type, 0)
+        self.ep_update()
       
         new_checks = move.new_checks
 
@@ -1162,28 +1920,21 @@ class Piece:
         self.dead = False
         self.resigned = False
 
-        self.fen = self.fen_code()
-
+    #FEN letters from the current name, so a promoted pawn is written out as
+    #the queen it has become
     def fen_code(self):
         fen = self.colour[0].lower() + PIECE_INFO[self.name]['FEN']
         return fen
    
+    #Type of rook from its position relative to the king along the
+    #colour's king side castling direction
     def rook_type(self, king_loc, rook_loc = False):
         if not rook_loc:
             rook_loc = self.loc
-        theta = np.radians(90*self.direction)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
+        r_step, f_step = DIRECTION_INFO[self.direction]['castle']['King']
         k_file, k_rank = move_to_rank_file(king_loc)
         R_file, R_rank = move_to_rank_file(rook_loc)
-        r_diff = k_rank - R_rank
-        f_diff = k_file - R_file
-
-        if s == 0:
-            f_diff = k_file - R_file
-            type_test = f_diff*c
-        elif c == 0:
-            r_diff = k_rank - R_rank
-            type_test = r_diff*s
+        type_test = (k_rank - R_rank)*r_step + (k_file - R_file)*f_step
 
         if type_test > 0:
             r_type = 'Queen'
@@ -1196,60 +1947,52 @@ class Piece:
     def rook_square(self, rook_type):
         k_file, k_rank = move_to_rank_file(self.loc)
 
-        theta = np.radians(90*self.direction)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
-        diff_arr = np.array([c, s]) 
-        if s == 0:
-            r_step = 0
-            f_step = c
-        elif c == 0:
-            r_step = s
-            f_step = 0
-        if rook_type == 'King':
-            r_file_start, r_file_end = k_file + f_step*1, k_file + f_step*-1
-            r_rank_start, r_rank_end = k_rank + r_step*1, k_rank + r_step*-1
-        elif rook_type == 'Queen':
-            r_file_start, r_file_end = k_file + f_step*-2, k_file + f_step*1
-            r_rank_start, r_rank_end = k_rank + r_step*-2, k_rank + r_step*1
-        r_start_square = rank_file_to_move(int(r_file_start), int(r_rank_start))
-        r_end_square = rank_file_to_move(int(r_file_end), int(r_rank_end))
+        info = DIRECTION_INFO[self.direction]
+        r_step, f_step = info['castle']['King']
+        start_steps, end_steps = info['rook_steps'][rook_type]
+        r_start_square = rank_file_to_move(k_file + f_step*start_steps,
+                k_rank + r_step*start_steps)
+        r_end_square = rank_file_to_move(k_file + f_step*end_steps,
+                k_rank + r_step*end_steps)
         return r_start_square, r_end_square
 
     def king_castle_square(self, castle_type):
         k_file_start, k_rank_start = move_to_rank_file(self.loc)
         
-        theta = np.radians(90*self.direction)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
-        diff_arr = np.array([c, s]) 
-        if s == 0:
-            r_step = 0
-            f_step = c
-        elif c == 0:
-            r_step = s
-            f_step = 0
-        if castle_type == 'King':
-            k_file_end = k_file_start + f_step*2 
-            k_rank_end = k_rank_start + r_step*2
-        elif castle_type == 'Queen':
-            k_file_end = k_file_start + f_step*-2
-            k_rank_end = k_rank_start + f_step*-2
-        k_end_square = rank_file_to_move(int(k_file_end), int(k_rank_end))
+        r_step, f_step = DIRECTION_INFO[self.direction]['castle'][castle_type]
+        k_end_square = rank_file_to_move(k_file_start + f_step*2,
+                k_rank_start + r_step*2)
         return k_end_square
 
+#Squares keep fixed slots (and a board's squares share their names with its
+#geometry) as every board holds nrows*ncols of them
 class Square:
-    def __init__(self, rank, file_, blocked = False):
+    __slots__ = ('rank', 'file_', 'idx', 'board', 'name', 'piece', 'blocked')
+
+    def __init__(self, rank, file_, blocked = False, idx = None, board = None):
         self.rank = rank
         self.file_ = file_
-        self.name = alphabet[file_-1] + '{}'.format(rank)
+        self.idx = idx
+        self.board = board
+        if board is not None:
+            self.name = board.geometry.names[idx]
+        else:
+            self.name = alphabet[file_-1] + '{}'.format(rank)
         self.piece = None
         self.blocked = blocked
 
+    #Board is told of every change so its other representations of the
+    #position stay in step with the square objects
     def add_piece(self, piece):
         piece.loc = self.name
         self.piece = piece
+        if self.board is not None:
+            self.board.square_update(self)
 
     def remove_piece(self):
         self.piece = None
+        if self.board is not None:
+            self.board.square_update(self)
 
     def obstruct(self):
         if self.blocked == False and self.piece == None:
@@ -1391,7 +2134,7 @@ class Move:
         #Checks if obstacle present - if no obstacle (False) or obstacle
         #is at end square then the move is legal. obstacle = True if 
         #trying to pass through blocked squares
-        obstacle = self.hori_obst(squares)
+        obstacle = self.path_obst(squares)
 
         if obstacle == False:
             return True
@@ -1409,7 +2152,7 @@ class Move:
             return False
 
         #same obstacle logic as hori_test
-        obstacle = self.verti_obst(squares)
+        obstacle = self.path_obst(squares)
 
         if obstacle == False:
             return True
@@ -1432,7 +2175,7 @@ class Move:
             return False
 
         #Same obstacle logic as hori_test
-        obstacle = self.diag_obst(squares)
+        obstacle = self.path_obst(squares)
         
         if obstacle == False:
             return True
@@ -1443,67 +2186,20 @@ class Move:
         else:
             return False
 
-    #checks for first obstacle for a given horizontal move
-    def hori_obst(self, squares):
-
-        #step sets if needs to loop positively or negatively through squares
-        if self.f_start < self.f_end:
-            step = 1
-        else:
-            step = -1
-
-        #Don't want to check obstacles in starting square so need to add step
-        #from before loop starts
-        range_start = self.f_start - 1 + step
-        range_end = self.f_end - 1 + step
-
-        #Loops between two board locations and stops if obstacle is found
-        for i in range(range_start, range_end, step):
-            obstruction = squares[self.r_start-1][i].obstruct()
+    #checks for first obstacle along a horizontal, vertical or diagonal move
+    #using the precomputed squares between start and end, then the end
+    #square itself. obstacle = True for blocked squares
+    def path_obst(self, squares):
+        nrows, ncols = squares.shape
+        flat_squares = squares.ravel()
+        start = (self.r_start-1)*ncols + self.f_start-1
+        end = (self.r_end-1)*ncols + self.f_end-1
+
+        for sq in between_table(nrows, ncols)[start][end]:
+            obstruction = flat_squares[sq].obstruct()
             if obstruction != False:
                 return obstruction
-        return False
-
-    #checks for first obstacle in given vertical move - logic same as 
-    #hori_obst
-    def verti_obst(self, squares):
-        if self.r_start < self.r_end:
-            step = 1
-        else:
-            step = -1
-        
-        range_start = self.r_start - 1 + step
-        range_end = self.r_end - 1 + step
-
-        for i in range(range_start, range_end, step):
-            obstruction = squares[i][self.f_start-1].obstruct()
-            if obstruction != False:
-                return obstruction
-        return False
-
-    #Checks for first obstacle in given diagonal move
-    def diag_obst(self, squares):
-        #step for both rank/file based on which direction move is occuring in
-        if self.r_start < self.r_end:
-            step_r = 1
-        else:
-            step_r = -1
-        if self.f_start < self.f_end:
-            step_f = 1
-        else:
-            step_f = -1
-
-        ind_r = self.r_start - 1 + step_r
-        ind_f = self.f_start - 1 + step_f
-
-        #Use difference to loop between board positions unless obstacle found
-        diff = abs(self.r_diff())
-
-        for i in range(0, diff):
-            obstruct_ = squares[ind_r+i*step_r][ind_f+i*step_f].obstruct()
-            if obstruct_ != False:
-                return obstruct_
-        return False
+        return flat_squares[end].obstruct()
         
     def knight_test(self, squares):
 
@@ -1527,44 +2223,42 @@ class Move:
             return False
 
     def pawn_test(self, squares, piece):
-        #Based on direction pawn is facing, defines rotation vectors that
-        #allow for testing if move is valid which represents
+        #Based on direction pawn is facing, looks up vectors that allow for
+        #testing if move is valid which represents
         #[change in rank, change in file]
-        direct = piece.direction
-        theta = np.radians(90*direct)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
+        info = DIRECTION_INFO[piece.direction]
 
-        #Arrays cover moving forward and capturing on either diagonal
-        diff_arr = np.array([c,s])
-
-        if direct % 2 == 0:
-            diff_diag_L = np.array([c-s, s-c])
-            diff_diag_R = np.array([c+s, s+c])
-        elif direct % 2 == 1:
-            diff_diag_R = np.array([c-s, s-c])
-            diff_diag_L = np.array([c+s, s+c])
+        #Vectors cover moving forward and capturing on either diagonal
+        diff_arr = info['forward']
+        diff_diag_L = info['diag_L']
+        diff_diag_R = info['diag_R']
 
         #checks for piece at end square and whether pawn has moved before
         piece_check = square_find(self.end, squares).piece
         moved_check = piece.last_move
 
         #The change in rank/file of the attempted move 
-        rf_diff = [self.r_diff(), self.f_diff()]
+        rf_diff = (self.r_diff(), self.f_diff())
         
         #Compares change in rank/file of attempted move with that of
         #theoretically allowed moves (either 1 move foward, 2 moves forward
         #or diagonal piece capture
-        m1_check = np.array_equal(rf_diff, diff_arr)
-        m2_check = np.array_equal(rf_diff, 2*diff_arr)
-        L_diag_check = np.array_equal(rf_diff, diff_diag_L)
-        R_diag_check = np.array_equal(rf_diff, diff_diag_R)
+        m1_check = rf_diff == diff_arr
+        m2_check = rf_diff == info['double']
+        L_diag_check = rf_diff == diff_diag_L
+        R_diag_check = rf_diff == diff_diag_R
 
         #If no piece present then check if can move 1 or 2 squares
         if piece_check == None:
             if m1_check:
                 return True
-            #2 moves forward only allowed if pawn has not moved
+            #2 moves forward only allowed if pawn has not moved and the
+            #square being passed over is empty
             elif m2_check and moved_check == False:
+                mid_square = rank_file_to_move(self.f_start + diff_arr[1],
+                        self.r_start + diff_arr[0])
+                if square_find(mid_square, squares).obstruct() != False:
+                    return False
                 self.double_push = True
                 return True
         #If piece present then check if diagonal capture is possible
@@ -1595,8 +2289,8 @@ class Move:
 
         direct_diff = (obstr_piece.direction - moving_piece.direction) %len(
                 COLOUR_INFO)
-        if ((direct_diff == 1 and np.array_equal(diff_diag_L, rf_diff)) or 
-                (direct_diff == 3 and np.array_equal(diff_diag_R, rf_diff))):
+        if ((direct_diff == 1 and diff_diag_L == tuple(rf_diff)) or 
+                (direct_diff == 3 and diff_diag_R == tuple(rf_diff))):
             self.enpassant_cap = obstr_piece.loc
             return True
         else:
@@ -1606,40 +2300,36 @@ class Move:
         if self.k_castle == 0 and self.q_castle == 0:
             return False
         
-        rf_diff = np.array([self.r_diff(), self.f_diff()])
+        rf_diff = (self.r_diff(), self.f_diff())
         
-        direct = piece.direction
-        theta = np.radians(90*direct)
-        c, s = round(np.cos(theta)), round(np.sin(theta))
-        diff_arr = np.array([s,c])
-
-        king_cast_arr, queen_cast_arr = diff_arr*2, diff_arr*-2
+        info = DIRECTION_INFO[piece.direction]
+        king_step, queen_step = info['castle']['King'], info['castle']['Queen']
 
-        king_cast_check = np.array_equal(rf_diff, king_cast_arr)
-        queen_cast_check = np.array_equal(rf_diff, queen_cast_arr)
+        king_cast_check = rf_diff == (2*king_step[0], 2*king_step[1])
+        queen_cast_check = rf_diff == (2*queen_step[0], 2*queen_step[1])
         
         if king_cast_check and self.k_castle == 1:
             self.castling = 'King'
-            r_step, f_step = king_cast_arr[0]/2, king_cast_arr[1]/2
-            square_dist = 3
+            r_step, f_step = king_step
+            square_dist = info['castle_dist']['King']
         elif queen_cast_check and self.q_castle == 1:
             self.castling = 'Queen'
-            r_step, f_step = queen_cast_arr[0]/2, queen_cast_arr[1]/2
-            square_dist = 4
+            r_step, f_step = queen_step
+            square_dist = info['castle_dist']['Queen']
         else:
             if king_cast_check or queen_cast_check:
                 print('King cannot castle on this side anymore')
             return False
 
         k_file, k_rank = move_to_rank_file(self.start)
-        r_file = int(k_file+f_step*square_dist)
-        r_rank = int(k_rank+r_step*square_dist)
+        r_file = k_file+f_step*square_dist
+        r_rank = k_rank+r_step*square_dist
         r_square = rank_file_to_move(r_file, r_rank)
         stop = False
         i = 1
 
         while i <= square_dist and stop == False:
-            file_, rank = int(k_file + i*f_step), int(k_rank + i*r_step)
+            file_, rank = k_file + i*f_step, k_rank + i*r_step
             square = rank_file_to_move(file_, rank)
             obstruction = square_find(square, squares).obstruct()
             if obstruction == True:
@@ -1653,6 +2343,33 @@ class Move:
                 stop = True
         return False
         
+#Record pushed by Board.make holding what is needed to reverse a move. It
+#doubles as the moved piece's last_move so double_push/total_number can be
+#read for en passant in the same way as a Move object
+class Undo:
+    def __init__(self, rec, piece, old_piece, board):
+        self.rec = rec
+        self.piece = piece
+        self.old_piece = old_piece
+        self.last_move = piece.last_move
+        self.double_push = False
+        self.total_number = 0
+
+        self.enp_square = None
+        self.enp_piece = None
+        self.castle_rook = None
+        self.eliminated = None
+        self.dead_pieces = []
+
+        self.to_play = board.to_play
+        self.colours = list(board.colours)
+        self.king_loc = dict(board.king_loc)
+        self.king_castle = dict(board.king_castle)
+        self.queen_castle = dict(board.queen_castle)
+        self.half_moves = tuple(board.half_moves)
+        self.key = board.key
+        self.ep_key = board.ep_key
+
 def move_to_rank_file(move_name):
     file_letter = move_name[0]
     file_number = int(alphabet.find(file_letter))+1
@@ -232,21 +232,7 @@ class Display(tk.Tk):
         win.grid_rowconfigure(0, weight=1)
     
     def comm_pgn_save(self):
-        move_list = self.board.move_list
-        moves_str = ''
-       
-        old_num = 0
-        for idx, move in enumerate(move_list):
-            if move.number == old_num:
-                moves_str += ' .. '
-            else:
-                moves_str += '\n' + str(move.number) + '. '
-            
-            moves_str += move.pgn
-
-            old_num = move.number
-
-        self.saving_moves = moves_str
+        self.saving_moves = self.board.moves_pgn()
 
     def load_game(self):
         win = tk.Toplevel()
@@ -322,9 +308,8 @@ class Display(tk.Tk):
                     self.piece_loc.values()).index(loc)]
             if piece.name != 'King':
                 self.board_canvas.itemconfig(obj, fill = 'black')
-        self.board.resign_apply()
-
-        self.res_king_move()
+        if self.board.resign_apply():
+            self.res_king_move()
 
         self.resign_check()
         
@@ -359,8 +344,8 @@ class Display(tk.Tk):
             king_loc = self.board.king_loc[self.board.to_play]
             king_col = self.board.square_find(king_loc).piece.colour
             if king_col in self.board.colours:
-                self.board.king_random_move(king_loc)
-                self.res_king_move()
+                if self.board.king_random_move(king_loc):
+                    self.res_king_move()
         if self.board.game_over and not self.game_over:
             self.game_over = True
             self.game_over_apply()
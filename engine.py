@@ -0,0 +1,539 @@
+from chess import COLOUR_INFO, ENPASSANT, PROMOTION
+from transposition import EXACT, LOWER, UPPER
+from zobrist import ZOBRIST_SEED
+from evaluation import MATERIAL_SCALE
+import random
+import time
+
+PARANOID = 'paranoid'
+MAXN = 'maxn'
+BRS = 'brs'
+
+#Evaluation weights - points are the FFA scores of Board.scores plus those
+#won along the searched line, material the colour's material and
+#piece-square score from Board.evaluation (MATERIAL_WEIGHT per pawn) and
+#ALIVE is given to every colour still playing so that values stay positive
+#and eliminated colours fall behind
+POINT_WEIGHT = 100
+MATERIAL_WEIGHT = 50
+ALIVE = 2000
+
+#Max-n values are shares of MAX_SUM, components sum to at most MAX_SUM as
+#shallow pruning needs
+MAX_SUM = 1000000
+INF = MAX_SUM + 1
+
+#Points as in Board.score_update
+MATE_POINTS = 20
+ENPASSANT_POINTS = 1
+
+#Keys mixed into transposition keys for the root colour and the points
+#(Board.scores plus those won along the line), which the position key does
+#not cover
+engine_rand = random.Random(ZOBRIST_SEED + 1)
+ROOT_KEYS = [engine_rand.getrandbits(64) for i in range(4)]
+KEY_MASK = (1 << 64) - 1
+
+#Nodes between looks at stop_event
+STOP_NODES = 64
+
+#Raised inside a search once the hard deadline has passed - the moves being
+#searched are taken back as it unwinds
+class SearchTimeout(Exception):
+    pass
+
+#Searches a Board for the side to play. Moves are applied with Board.make
+#and taken back with Board.unmake so the board is unchanged afterwards. As
+#in Board.move the colours a move leaves without a legal move are
+#eliminated for the rest of the line with Board.mate_apply (checkmate or
+#stalemate - both score MATE_POINTS for the mover as in score_update) and
+#the turn passes on
+class Engine:
+    def __init__(self, board, strategy = PARANOID, tt = None):
+        self.board = board
+        self.strategy = strategy
+        self.tt = tt
+        self.nodes = 0
+        self.stop_time = None
+
+        #multiprocessing.Event that stops the search as the deadline does
+        #once set (for pondering)
+        self.stop_event = None
+
+        #Points won along the searched line per colour index and the stack
+        #of (move record or None, colour index, points, eliminated colours
+        #(the colour for None), side to play before, checks after)
+        self.gains = [0, 0, 0, 0]
+        self.line = []
+
+    #Returns (best move, value, principal variation) for the side to play,
+    #value is a share vector for max-n and the root share otherwise. Given
+    #colour the search is for colour instead (pondering while the other
+    #colours are to play) and the move is that of the side to play
+    def search(self, depth, colour = None):
+        board = self.board
+        self.nodes = 0
+        if colour is None:
+            colour = board.to_play
+        if self.terminal() or colour not in board.colours:
+            return None, None, []
+        if colour == board.to_play and next(board.legal_moves(colour),
+                None) is None:
+            return None, None, []
+        root = COLOUR_INFO.index(colour)
+        if self.strategy == MAXN:
+            value, pv = self.maxn(depth, 0)
+        elif self.strategy == BRS:
+            value, pv = self.brs(depth, -INF, INF, root)
+        else:
+            value, pv = self.paranoid(depth, -INF, INF, root)
+        return (pv[0] if pv else None), value, pv
+
+    def best_move(self, depth):
+        return self.search(depth)[0]
+
+    #Share vector of every colour at the end of pv, a line found by a
+    #search of depth for the root colour index root. The line is played out
+    #taking out colours with no legal move where the search does (and
+    #passing the turn back to root after each reply for BRS) and taken back
+    def pv_values(self, pv, root, depth):
+        board = self.board
+        colour = COLOUR_INFO[root]
+        to_play = board.to_play
+        base = len(self.line)
+        try:
+            for ply in range(len(pv) + 1):
+                if ply >= depth or self.terminal():
+                    break
+                if self.strategy == BRS and board.to_play != colour:
+                    for opponent in list(board.colours):
+                        if (opponent != colour and
+                                opponent not in board.resign_list and
+                                next(board.legal_moves(opponent),
+                                None) is None):
+                            self.eliminate_apply(opponent)
+                else:
+                    while (not self.terminal() and next(board.legal_moves(
+                            board.to_play), None) is None):
+                        self.eliminate_apply()
+                if ply == len(pv):
+                    break
+                rec = pv[ply]
+                mover = board.square_list[rec.start].piece.colour
+                self.move_apply(rec)
+                if self.strategy == BRS and mover != colour:
+                    board.to_play_set(colour)
+            return self.shares(self.evaluate())
+        finally:
+            while len(self.line) > base:
+                self.move_undo()
+            board.to_play_set(to_play)
+
+    #Searches depth start_depth, start_depth + 1, ... max_depth yielding
+    #after each finished depth a dict of depth, move, value, pv, nodes (of
+    #the depth), total_nodes, time (seconds since the start) and nps. No
+    #depth is started after soft_ms milliseconds and the depth being
+    #searched at hard_ms is abandoned, leaving the board as it was. colour is
+    #passed on to search
+    def iterate(self, max_depth = 64, hard_ms = None, soft_ms = None,
+            start_depth = 1, colour = None):
+        start = time.time()
+        if hard_ms is not None:
+            self.stop_time = start + hard_ms/1000
+        total_nodes = 0
+        try:
+            for depth in range(start_depth, max_depth + 1):
+                try:
+                    move, value, pv = self.search(depth, colour)
+                except SearchTimeout:
+                    return
+                total_nodes = total_nodes + self.nodes
+                elapsed = time.time() - start
+                yield {'depth': depth, 'move': move, 'value': value,
+                        'pv': pv, 'nodes': self.nodes,
+                        'total_nodes': total_nodes, 'time': elapsed,
+                        'nps': int(total_nodes/elapsed) if elapsed > 0 else 0}
+                if move is None:
+                    return
+                if soft_ms is not None and elapsed*1000 >= soft_ms:
+                    return
+        finally:
+            self.stop_time = None
+
+    #Iterative deepening to a clock - returns the result of the last finished
+    #depth, calling callback with each one as it finishes. If not even depth
+    #1 finishes the first move in search order is returned at depth 0
+    def think(self, hard_ms = None, soft_ms = None, max_depth = 64,
+            callback = None):
+        result = None
+        for result in self.iterate(max_depth, hard_ms, soft_ms):
+            if callback is not None:
+                callback(result)
+        if result is None:
+            board = self.board
+            moves = self.ordered(list(board.legal_moves(board.to_play)))
+            move = moves[0] if moves else None
+            result = {'depth': 0, 'move': move, 'value': None,
+                    'pv': [move] if move else [], 'nodes': 0,
+                    'total_nodes': 0, 'time': 0, 'nps': 0}
+        return result
+
+    #Counts a node, raising SearchTimeout once past the hard deadline or
+    #once stop_event is set
+    def node_visit(self):
+        self.nodes = self.nodes + 1
+        if self.stop_time is not None and time.time() >= self.stop_time:
+            raise SearchTimeout
+        if (self.stop_event is not None and self.nodes % STOP_NODES == 0 and
+                self.stop_event.is_set()):
+            raise SearchTimeout
+
+    #Paranoid alpha-beta - the root colour maximises its share and every
+    #other colour is treated as one coalition minimising it
+    def paranoid(self, depth, alpha, beta, root):
+        self.node_visit()
+        if depth == 0 or self.terminal():
+            return self.shares(self.evaluate())[root], []
+
+        board = self.board
+        moves = list(board.legal_moves(board.to_play))
+        if not moves:
+            self.eliminate_apply()
+            try:
+                return self.paranoid(depth, alpha, beta, root)
+            finally:
+                self.move_undo()
+
+        key = self.tt_key(root)
+        tt_move, alpha, beta, value = self.tt_bounds(key, depth, moves,
+                alpha, beta)
+        if value is not None:
+            return value, [tt_move]
+
+        maximise = board.to_play == COLOUR_INFO[root]
+        alpha_start, beta_start = alpha, beta
+        best, best_pv = None, []
+        for rec in self.ordered(moves, tt_move):
+            self.move_apply(rec)
+            try:
+                value, pv = self.paranoid(depth - 1, alpha, beta, root)
+            finally:
+                self.move_undo()
+            if best is None or (value > best if maximise else value < best):
+                best, best_pv = value, [rec] + pv
+            if maximise:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        self.tt_save(key, best_pv[0], depth, best, alpha_start, beta_start)
+        return best, best_pv
+
+    #Best-Reply Search - after each move of the root colour only the single
+    #strongest reply among all its opponents is searched (the others pass)
+    #and the root colour is to play again, so alpha-beta runs as in a two
+    #player game. Opponents without a legal move are eliminated first
+    def brs(self, depth, alpha, beta, root):
+        self.node_visit()
+        board = self.board
+        colour = COLOUR_INFO[root]
+        if depth == 0 or self.terminal() or colour not in board.colours:
+            return self.shares(self.evaluate())[root], []
+
+        maximise = board.to_play == colour
+        eliminated = 0
+        try:
+            if maximise:
+                moves = list(board.legal_moves(colour))
+                if not moves:
+                    self.eliminate_apply()
+                    eliminated = 1
+            else:
+                moves = []
+                for opponent in list(board.colours):
+                    if opponent == colour or opponent in board.resign_list:
+                        continue
+                    replies = list(board.legal_moves(opponent))
+                    if not replies:
+                        self.eliminate_apply(opponent)
+                        eliminated = eliminated + 1
+                    moves.extend(replies)
+            if not moves:
+                return self.shares(self.evaluate())[root], []
+            return self.brs_moves(depth, alpha, beta, root, moves, maximise)
+        finally:
+            for i in range(eliminated):
+                self.move_undo()
+
+    def brs_moves(self, depth, alpha, beta, root, moves, maximise):
+        board = self.board
+        colour = COLOUR_INFO[root]
+        key = self.tt_key(root)
+        tt_move, alpha, beta, value = self.tt_bounds(key, depth, moves,
+                alpha, beta)
+        if value is not None:
+            return value, [tt_move]
+
+        alpha_start, beta_start = alpha, beta
+        best, best_pv = None, []
+        for rec in self.ordered(moves, tt_move):
+            self.move_apply(rec)
+            if not maximise:
+                board.to_play_set(colour)
+            try:
+                value, pv = self.brs(depth - 1, alpha, beta, root)
+            finally:
+                self.move_undo()
+            if best is None or (value > best if maximise else value < best):
+                best, best_pv = value, [rec] + pv
+            if maximise:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        self.tt_save(key, best_pv[0], depth, best, alpha_start, beta_start)
+        return best, best_pv
+
+    #Max-n - each colour maximises its own component of the share vector.
+    #As the shares sum to at most MAX_SUM a colour that has found a reply
+    #worth MAX_SUM - parent_best to itself leaves the colour above less than
+    #it already has, so the remaining replies are pruned
+    def maxn(self, depth, parent_best):
+        self.node_visit()
+        if depth == 0 or self.terminal():
+            return self.shares(self.evaluate()), []
+
+        board = self.board
+        moves = list(board.legal_moves(board.to_play))
+        if not moves:
+            self.eliminate_apply()
+            try:
+                return self.maxn(depth, parent_best)
+            finally:
+                self.move_undo()
+
+        cidx = COLOUR_INFO.index(board.to_play)
+        key = self.tt_key(cidx)
+        tt_move = None
+        if self.tt is not None:
+            entry = self.tt.probe(key)
+            if entry is not None:
+                tt_move = entry[0]
+
+        best, best_pv = None, []
+        for rec in self.ordered(moves, tt_move):
+            self.move_apply(rec)
+            try:
+                value, pv = self.maxn(depth - 1,
+                        best[cidx] if best is not None else 0)
+            finally:
+                self.move_undo()
+            if best is None or value[cidx] > best[cidx]:
+                best, best_pv = value, [rec] + pv
+            if best[cidx] >= MAX_SUM - parent_best:
+                break
+
+        if self.tt is not None:
+            self.tt.store(key, best_pv[0], depth, best, LOWER)
+        return best, best_pv
+
+    #Captures first (most valuable live victim, then least valuable
+    #attacker), promotions next and the transposition table move before all
+    def ordered(self, moves, tt_move = None):
+        squares = self.board.square_list
+
+        def order_key(rec):
+            if rec == tt_move:
+                return -INF
+            score = 0
+            target = squares[rec.end].piece
+            if target is not None and not target.dead:
+                score = 100*target.value - squares[rec.start].piece.value
+            if rec.flag & PROMOTION:
+                score = score + 800
+            return -score
+
+        return sorted(moves, key = order_key)
+
+    #Applies a move adding the points score_update would give for it -
+    #capture value, en passant, capturing a king and double/triple checks.
+    #As in Board.move every colour the move leaves without a legal move is
+    #taken out straight away and scored for the mover - a checked king with
+    #no evasion is mated, any other colour stalemated
+    def move_apply(self, rec):
+        board = self.board
+        piece = board.square_list[rec.start].piece
+        points = self.capture_points(rec, piece)
+        board.make(rec)
+        if board.undo_stack[-1].eliminated:
+            points = points + MATE_POINTS
+        checks = board.all_check_test()
+        points = points + self.check_bonus(piece, checks)
+
+        eliminated = []
+        for colour, checkers in checks.items():
+            if board.test_mate(checkers, colour):
+                board.mate_apply(colour)
+                eliminated.append(colour)
+                points = points + MATE_POINTS
+        resigned = 0
+        for colour in list(board.colours):
+            if (colour == piece.colour or colour in checks or
+                    next(board.legal_moves(colour), None) is not None):
+                continue
+            board.mate_apply(colour)
+            eliminated.append(colour)
+            if colour in board.resign_list:
+                resigned = resigned + 1
+            else:
+                points = points + MATE_POINTS
+        if eliminated:
+            points = points + 10*resigned*len(board.colours)
+            col_idx = (board.colours.index(piece.colour) + 1) % len(
+                    board.colours)
+            board.to_play_set(board.colours[col_idx])
+
+        self.gains[piece.direction] = self.gains[piece.direction] + points
+        self.line.append((rec, piece.direction, points, eliminated, None,
+                checks))
+
+    #Removes colour (the side to play if not given), found without a legal
+    #move on its turn, for the rest of the line. move_apply already takes
+    #out the colours a move stalls, so this only meets positions searched
+    #as given (or turns BRS hands back). The colour that moved last is
+    #credited as score_update credits a stalemate
+    def eliminate_apply(self, colour = None):
+        board = self.board
+        to_play = board.to_play
+        if colour is None:
+            colour = to_play
+        idx = board.colours.index(colour)
+        mover = self.line[-1][1] if self.line else None
+        board.mate_apply(colour)
+        if colour == to_play:
+            board.to_play_set(board.colours[idx % len(board.colours)])
+        if colour in board.resign_list:
+            points = 10*len(board.colours)
+        else:
+            points = MATE_POINTS
+        if mover is not None:
+            self.gains[mover] = self.gains[mover] + points
+        self.line.append((None, mover, points, colour, to_play,
+                self.line_checks()))
+
+    def move_undo(self):
+        rec, mover, points, eliminated, to_play, checks = self.line.pop()
+        board = self.board
+        if mover is not None:
+            self.gains[mover] = self.gains[mover] - points
+        if rec is None:
+            board.mate_undo(eliminated)
+            board.to_play_set(to_play)
+        else:
+            for colour in reversed(eliminated):
+                board.mate_undo(colour)
+            board.unmake()
+
+    #Checks (king colour to checking pieces) standing after the last move of
+    #the line, or of the game before the search
+    def line_checks(self):
+        if self.line:
+            return self.line[-1][5]
+        board = self.board
+        return board.move_list[-1].checks if board.move_list else {}
+
+    def capture_points(self, rec, piece):
+        if rec.flag & ENPASSANT:
+            return ENPASSANT_POINTS
+        target = self.board.square_list[rec.end].piece
+        if (target is None or target.dead or target.resigned or
+                piece.resigned or target.colour == piece.colour or
+                target.name == 'King'):
+            return 0
+        return target.value
+
+    #Bonus for checking two or three kings at once with piece - as in
+    #Board.move a king counts when checks (after the move) holds a checker
+    #that was not checking it after the move before
+    def check_bonus(self, piece, checks):
+        new_checks = self.board.new_check_test(checks, self.line_checks())
+        if new_checks == 2:
+            return 1 if piece.name == 'Queen' else 5
+        elif new_checks >= 3:
+            return 5 if piece.name == 'Queen' else 20
+        return 0
+
+    #Game over once at most one colour is still playing unresigned
+    def terminal(self):
+        board = self.board
+        active = [colour for colour in board.colours
+                if colour not in board.resign_list]
+        return len(active) <= 1
+
+    #Raw value per colour index - points, and material plus ALIVE for the
+    #colours still playing
+    def evaluate(self):
+        board = self.board
+        material = board.evaluation()
+        values = []
+        for cidx, colour in enumerate(COLOUR_INFO):
+            value = POINT_WEIGHT*(board.scores[colour] + self.gains[cidx])
+            if colour in board.colours and colour not in board.resign_list:
+                value = (value + ALIVE +
+                        material[cidx]*MATERIAL_WEIGHT//MATERIAL_SCALE)
+            values.append(max(value, 0))
+        return values
+
+    #Values scaled to shares of MAX_SUM
+    def shares(self, values):
+        total = sum(values)
+        if total == 0:
+            return [MAX_SUM//4]*4
+        return [value*MAX_SUM//total for value in values]
+
+    #Transposition table move of key and the window narrowed by its bound,
+    #value is set when the stored result answers the search outright
+    def tt_bounds(self, key, depth, moves, alpha, beta):
+        if self.tt is None:
+            return None, alpha, beta, None
+        entry = self.tt.probe(key)
+        if entry is None:
+            return None, alpha, beta, None
+        tt_move, tt_depth, scores, bound = entry
+        if tt_depth < depth or tt_move not in moves:
+            return tt_move, alpha, beta, None
+        if bound == EXACT:
+            return tt_move, alpha, beta, scores[0]
+        elif bound == LOWER:
+            alpha = max(alpha, scores[0])
+        else:
+            beta = min(beta, scores[0])
+        if alpha >= beta:
+            return tt_move, alpha, beta, scores[0]
+        return tt_move, alpha, beta, None
+
+    def tt_save(self, key, move, depth, value, alpha, beta):
+        if self.tt is None:
+            return
+        if value <= alpha:
+            bound = UPPER
+        elif value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, move, depth, (value, 0, 0, 0), bound)
+
+    #Key of the position for root colour index cidx. The points are those
+    #of Board.scores plus those won along the line, so a position reached in
+    #a search from before some moves were played (pondering) has the key it
+    #gets once they are
+    def tt_key(self, cidx):
+        scores = self.board.scores
+        points = tuple(scores[colour] + self.gains[i]
+                for i, colour in enumerate(COLOUR_INFO))
+        return (self.board.hash() ^ ROOT_KEYS[cidx] ^
+                (hash(points) & KEY_MASK))
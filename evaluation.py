@@ -0,0 +1,78 @@
+import numpy as np
+from mailbox import TYPE_CODES, COLOUR_SHIFT, DEAD_BIT
+
+#Score of a piece is its value (PIECE_INFO['value'], passed in by Board as
+#values) times MATERIAL_SCALE plus its piece-square table entry
+MATERIAL_SCALE = 100
+
+#Cache of evaluators per board shape
+evaluator_cache = {}
+
+#Piece-square tables for Red (Piece.direction 0) indexed [rank-1][file-1].
+#Pawns gain as they near the promotion rank, minor pieces and the queen
+#for the centre, rooks a little for the centre and the king for staying on
+#its home ranks
+def base_tables(nrows, ncols, prom_rf):
+    ranks = np.arange(nrows).reshape(nrows, 1)*np.ones((1, ncols))
+    files = np.ones((nrows, 1))*np.arange(ncols).reshape(1, ncols)
+    centre = np.maximum(np.abs(ranks - (nrows - 1)/2),
+            np.abs(files - (ncols - 1)/2))
+    central = (nrows + ncols)/4 - centre
+
+    pawn = np.clip(ranks - 1, 0, prom_rf - 2)*6 + np.where(
+            np.abs(files - (ncols - 1)/2) < 2, 4, 0)
+    tables = {'Pawn': pawn,
+            'Knight': central*4,
+            'Bishop': central*3,
+            'Rook': central*1,
+            'Queen': central*2,
+            'King': -np.clip(ranks - 1, 0, None)*10}
+    return {name: np.rint(table).astype(np.int32)
+            for name, table in tables.items()}
+
+#Table of base turned to face the colour with Piece.direction direct -
+#Yellow sits opposite Red and Blue/Green mirror them across the diagonal
+def colour_table(base, direct):
+    table = base if direct < 2 else base[::-1, ::-1]
+    if direct % 2 == 1:
+        table = table.T
+    return table
+
+#Scores all four colours from mailbox codes (Board.mailbox_view). table
+#holds the score of every code on every square split by colour index, so a
+#board is scored by one gather of its cells and a sum - dead pieces,
+#resigned colours, empty and blocked squares score nothing. square_values
+#holds the same scores as lists per square indexed by code (the colour is
+#that of the code) for updating a running total as single squares change
+class Evaluator:
+    def __init__(self, values, nrows = 14, ncols = 14, prom_rf = 8):
+        self.nrows = nrows
+        self.ncols = ncols
+        n = nrows*ncols
+        bases = base_tables(nrows, ncols, prom_rf)
+        self.table = np.zeros((256, n, 4), dtype = np.int32)
+        for name, type_code in TYPE_CODES.items():
+            value = values[name]*MATERIAL_SCALE
+            for direct in range(4):
+                code = type_code | (direct << COLOUR_SHIFT)
+                scores = value + colour_table(bases[name], direct).ravel()
+                self.table[code, :, direct] = scores
+        self.table[DEAD_BIT:, :, :] = 0
+        self.squares = np.arange(n)
+        self.square_values = self.table[:128].sum(axis = 2).T.tolist()
+
+    #codes of shape (nrows, ncols) give a (4,) score array and a stacked
+    #(N, nrows, ncols) batch an (N, 4) array, indexed by colour index
+    def evaluate(self, codes):
+        codes = np.asarray(codes)
+        cells = codes.reshape(codes.shape[:-2] + (-1,)).astype(np.uint8)
+        return self.table[cells, self.squares].sum(axis = -2)
+
+    def board_scores(self, board):
+        return self.evaluate(board.mailbox_view())
+
+def evaluator_get(values, nrows = 14, ncols = 14, prom_rf = 8):
+    key = (tuple(sorted(values.items())), nrows, ncols, prom_rf)
+    if key not in evaluator_cache:
+        evaluator_cache[key] = Evaluator(values, nrows, ncols, prom_rf)
+    return evaluator_cache[key]
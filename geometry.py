@@ -0,0 +1,116 @@
+import string
+
+alphabet = string.ascii_lowercase
+
+#8 direction vectors [f_step, r_step] in the same order used by
+#Board.hori_verti_diag_extent - HORI/DIAG index the rook/bishop subsets
+DIRECTIONS = [[-1, -1], [-1, 0], [-1, 1], [0, -1],
+            [0, 1], [1, -1], [1, 0], [1, 1]]
+HORI = (1, 3, 4, 6)
+DIAG = (0, 2, 5, 7)
+
+KNIGHT_STEPS = [[2, 1], [2, -1], [-2, 1], [-2, -1],
+                [1, 2], [1, -2], [-1, 2], [-1, -2]]
+
+#Cache of Geometry objects and between tables so that every board of the
+#same shape shares one set of tables
+geometry_cache = {}
+between_cache = {}
+
+#Square tables for a board of nrows x ncols with corner x corner squares
+#blocked in each corner. Squares are indexed (rank-1)*ncols + (file-1)
+class Geometry:
+    def __init__(self, nrows, ncols, corner):
+        self.nrows = nrows
+        self.ncols = ncols
+        self.corner = corner
+        self.n = nrows*ncols
+
+        self.names = []
+        self.blocked = []
+        for i in range(nrows):
+            for j in range(ncols):
+                self.names.append(alphabet[j] + '{}'.format(i+1))
+                self.blocked.append((i < corner or i >= nrows - corner)
+                        and (j < corner or j >= ncols - corner))
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+
+        #rays[sq][d] - squares from sq along direction d in order, stopping
+        #before the board edge or a blocked corner square
+        self.rays = []
+        self.knight = []
+        self.king = []
+        for sq in range(self.n):
+            rank, file_ = divmod(sq, ncols)
+            sq_rays = []
+            for f_step, r_step in DIRECTIONS:
+                ray = []
+                r_index, f_index = rank + r_step, file_ + f_step
+                while self.on_board(r_index, f_index):
+                    ray.append(r_index*ncols + f_index)
+                    r_index, f_index = r_index + r_step, f_index + f_step
+                sq_rays.append(tuple(ray))
+            self.rays.append(tuple(sq_rays))
+            self.knight.append(self.steps(rank, file_, KNIGHT_STEPS))
+            self.king.append(self.steps(rank, file_, DIRECTIONS))
+
+        self.between = between_table(nrows, ncols)
+
+    #True if rank/file indices are inside the board and not blocked
+    def on_board(self, r_index, f_index):
+        if not (0 <= r_index < self.nrows and 0 <= f_index < self.ncols):
+            return False
+        return not self.blocked[r_index*self.ncols + f_index]
+
+    def steps(self, rank, file_, offsets):
+        targets = []
+        for f_step, r_step in offsets:
+            if self.on_board(rank + r_step, file_ + f_step):
+                targets.append((rank + r_step)*self.ncols + file_ + f_step)
+        return tuple(targets)
+
+    #Index into DIRECTIONS of the line from sq_a to sq_b, or None if the
+    #squares do not share a rank, file or diagonal
+    def direction(self, sq_a, sq_b):
+        r_a, f_a = divmod(sq_a, self.ncols)
+        r_b, f_b = divmod(sq_b, self.ncols)
+        return line_direction(r_b - r_a, f_b - f_a)
+
+#Returns the Geometry for a board shape, building it on first use
+def geometry_get(nrows, ncols, corner):
+    key = (nrows, ncols, corner)
+    if key not in geometry_cache:
+        geometry_cache[key] = Geometry(nrows, ncols, corner)
+    return geometry_cache[key]
+
+def line_direction(r_diff, f_diff):
+    if r_diff == 0 and f_diff == 0:
+        return None
+    if r_diff != 0 and f_diff != 0 and abs(r_diff) != abs(f_diff):
+        return None
+    step = [(f_diff > 0) - (f_diff < 0), (r_diff > 0) - (r_diff < 0)]
+    return DIRECTIONS.index(step)
+
+#between[sq_a][sq_b] - squares strictly between two squares sharing a rank,
+#file or diagonal. Blocked squares are included so that obstruction tests
+#can see them, only the board shape matters
+def between_table(nrows, ncols):
+    key = (nrows, ncols)
+    if key in between_cache:
+        return between_cache[key]
+
+    between = []
+    for sq in range(nrows*ncols):
+        rank, file_ = divmod(sq, ncols)
+        sq_between = {}
+        for f_step, r_step in DIRECTIONS:
+            path = []
+            r_index, f_index = rank + r_step, file_ + f_step
+            while 0 <= r_index < nrows and 0 <= f_index < ncols:
+                sq_between[r_index*ncols + f_index] = tuple(path)
+                path.append(r_index*ncols + f_index)
+                r_index, f_index = r_index + r_step, f_index + f_step
+        between.append(sq_between)
+
+    between_cache[key] = between
+    return between
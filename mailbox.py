@@ -0,0 +1,108 @@
+from array import array
+import numpy as np
+from geometry import DIRECTIONS
+
+#Cell values of the mailbox - 0 is an empty square and OFFBOARD marks the
+#padding round the edge and the blocked corner squares. A piece is stored
+#as its type code with the colour index (Piece.direction) shifted above it
+#and bits for dead/resigned pieces, so every value fits in an int8
+EMPTY = 0
+OFFBOARD = -1
+TYPE_CODES = {'Pawn': 1, 'Knight': 2, 'Bishop': 3, 'Rook': 4, 'Queen': 5,
+            'King': 6}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+TYPE_MASK = 7
+COLOUR_SHIFT = 3
+DEAD_BIT = 32
+RESIGNED_BIT = 64
+
+#Width of the padding on each side - 2 so knight steps from the edge land
+#on OFFBOARD cells
+PAD = 2
+
+def piece_code(piece):
+    if piece is None:
+        return EMPTY
+    code = TYPE_CODES[piece.name] | (piece.direction << COLOUR_SHIFT)
+    if piece.dead:
+        code = code | DEAD_BIT
+    if piece.resigned:
+        code = code | RESIGNED_BIT
+    return code
+
+#True if a piece of colour index cidx may move onto a cell holding code -
+#empty, a dead piece or a piece of another colour
+def code_free(code, cidx):
+    if code == EMPTY:
+        return True
+    if code == OFFBOARD:
+        return False
+    return bool(code & DEAD_BIT) or (code >> COLOUR_SHIFT) & 3 != cidx
+
+def code_colour(code):
+    return (code >> COLOUR_SHIFT) & 3
+
+def code_name(code):
+    return TYPE_NAMES[code & TYPE_MASK]
+
+#Cache of (empty cells, pad_index, cell_sq, offsets) per board geometry so
+#every mailbox of the same shape shares its index tables
+layout_cache = {}
+
+#Padded 1-D board of int8 cells kept in step with Board.squares. Squares are
+#addressed with the geometry index (rank-1)*ncols + (file-1) and mapped to
+#their padded cell through pad_index (cell_sq is the reverse). Stepping a
+#cell by one of the direction offsets runs into OFFBOARD at the edge or a
+#corner so scans need no bounds checks. Only the cells belong to the
+#mailbox, the index tables are shared per geometry - a 14x14 board's cells
+#take about 400 bytes against some 20 KB for its grid of Square objects
+#(the suite's memory check keeps this above tenfold)
+class Mailbox:
+    def __init__(self, geometry):
+        self.nrows = geometry.nrows
+        self.ncols = geometry.ncols
+        self.width = geometry.ncols + 2*PAD
+        self.height = geometry.nrows + 2*PAD
+        empty, self.pad_index, self.cell_sq, self.offsets = layout_get(
+                geometry)
+        self.cells = array('b', empty)
+
+    def get(self, sq):
+        return self.cells[self.pad_index[sq]]
+
+    def set(self, sq, code):
+        self.cells[self.pad_index[sq]] = code
+
+    #Zero-copy int8 NumPy view of the padded cells, shape (height, width)
+    def view(self):
+        return np.frombuffer(self.cells, dtype = np.int8).reshape(
+                self.height, self.width)
+
+    #Zero-copy view of the playing area only, indexed [rank-1][file-1]
+    def board_view(self):
+        return self.view()[PAD:PAD + self.nrows, PAD:PAD + self.ncols]
+
+#Empty padded cells and the index tables of a mailbox for geometry, built
+#on first use
+def layout_get(geometry):
+    key = (geometry.nrows, geometry.ncols, geometry.corner)
+    if key in layout_cache:
+        return layout_cache[key]
+
+    width = geometry.ncols + 2*PAD
+    height = geometry.nrows + 2*PAD
+    empty = array('b', [OFFBOARD]*(width*height))
+    pad_index = []
+    cell_sq = [None]*len(empty)
+    for sq in range(geometry.n):
+        rank, file_ = divmod(sq, geometry.ncols)
+        cell = (rank + PAD)*width + file_ + PAD
+        pad_index.append(cell)
+        cell_sq[cell] = sq
+        if not geometry.blocked[sq]:
+            empty[cell] = EMPTY
+
+    #Cell offsets for the geometry DIRECTIONS [f_step, r_step]
+    offsets = tuple(r_step*width + f_step for f_step, r_step in DIRECTIONS)
+    layout_cache[key] = (empty, tuple(pad_index), tuple(cell_sq), offsets)
+    return layout_cache[key]
@@ -0,0 +1,209 @@
+from chess import COLOUR_INFO
+from engine import Engine
+
+#Proof or disproof number of a settled node
+PN_INF = 1000000000
+
+#Tree nodes searched at most before giving up
+MAX_NODES = 100000
+
+#Node types - the attacker needs one move that works (OR), the defence
+#needs one reply that holds (AND)
+OR_NODE = 0
+AND_NODE = 1
+
+#Node of the proof tree - the position after move, depth plies from the
+#root. moves are the moves still to be expanded and eliminated the colours
+#without a legal move taken out on reaching the node (replayed on every
+#visit)
+class MateNode:
+    def __init__(self, move = None, parent = None, depth = 0):
+        self.move = move
+        self.parent = parent
+        self.depth = depth
+        self.kind = OR_NODE
+        self.proof = 1
+        self.disproof = 1
+        self.moves = None
+        self.eliminated = ()
+        self.children = []
+
+#Proof-number search for a forced mate. The side to play (the attacker) may
+#only give check to the target colour, every other colour (the target with
+#its evasions and the colours between, which may help or hinder it) is
+#defence. A line is proved when a move of the attacker, at most plies plies
+#from the root, mates the target - Engine.move_apply takes the target out
+#as Board.move does, with its king in check from the attacker and no
+#evasion (or the attacker takes the king). It is disproved when the target
+#gets a turn out of the attacker's check, the attacker or target is taken
+#out otherwise or plies run out. Moves go through Engine so colours with no
+#legal move on the way are eliminated as in play
+class MateSearch:
+    def __init__(self, board, max_nodes = MAX_NODES):
+        self.board = board
+        self.engine = Engine(board)
+        self.max_nodes = max_nodes
+        self.nodes = 0
+
+    #Moves by which the side to play mates colour within plies plies (the
+    #mating move being at most plies plies deep, so 1 is a mate in one)
+    #whatever the other colours play (the defence picked is one of them), or
+    #None if no mate is proved within max_nodes nodes
+    def mate_find(self, colour, plies):
+        board = self.board
+        engine = self.engine
+        self.attacker = board.to_play
+        self.target = colour
+        self.plies = plies
+        self.nodes = 1
+        if colour == self.attacker or colour not in board.colours:
+            return None
+
+        base = len(engine.line)
+        root = MateNode()
+        self.evaluate(root)
+        self.unwind(base)
+        while root.proof and root.disproof and self.nodes < self.max_nodes:
+            node = root
+            self.enter(node)
+            while node.children:
+                node = self.select(node)
+                engine.move_apply(node.move)
+                self.enter(node)
+            self.expand(node)
+            self.unwind(base)
+            while node is not None:
+                self.numbers_update(node)
+                node = node.parent
+
+        if root.proof:
+            return None
+        return self.line(root)
+
+    #Most proving child - the easiest to prove below the attacker, the
+    #easiest to disprove below the defence
+    def select(self, node):
+        if node.kind == OR_NODE:
+            return min(node.children, key = lambda child: child.proof)
+        return min(node.children, key = lambda child: child.disproof)
+
+    #Adds a child per move of node, stopping once node is settled
+    def expand(self, node):
+        engine = self.engine
+        for rec in node.moves:
+            child = MateNode(rec, node, node.depth + 1)
+            base = len(engine.line)
+            engine.move_apply(rec)
+            self.evaluate(child)
+            self.unwind(base)
+            node.children.append(child)
+            self.nodes = self.nodes + 1
+            if node.kind == OR_NODE and child.proof == 0:
+                break
+            if node.kind == AND_NODE and child.disproof == 0:
+                break
+        node.moves = None
+
+    def numbers_update(self, node):
+        if not node.children:
+            return
+        if node.kind == OR_NODE:
+            node.proof = min(child.proof for child in node.children)
+            node.disproof = min(PN_INF, sum(child.disproof
+                    for child in node.children))
+        else:
+            node.proof = min(PN_INF, sum(child.proof
+                    for child in node.children))
+            node.disproof = min(child.disproof for child in node.children)
+
+    #Sets the type, moves and starting numbers of node once its move is
+    #made, eliminating colours between with no legal move. Nodes with more
+    #moves to try start harder to settle
+    def evaluate(self, node):
+        board = self.board
+        engine = self.engine
+        if node.move is not None and self.mated():
+            node.proof, node.disproof = 0, PN_INF
+            return
+        aidx = COLOUR_INFO.index(self.attacker)
+        eliminated = []
+        while True:
+            if (node.depth >= self.plies or
+                    self.attacker not in board.colours or
+                    self.target not in board.colours or engine.terminal()):
+                break
+            colour = board.to_play
+            if colour == self.attacker:
+                moves = self.checking_moves()
+                if not moves:
+                    break
+                node.kind = OR_NODE
+                node.moves = moves
+                node.proof, node.disproof = 1, len(moves)
+                node.eliminated = tuple(eliminated)
+                return
+            if colour == self.target:
+                king_sq = board.geometry.index[board.king_loc[colour]]
+                if not board.attack_maps.counts[aidx][king_sq]:
+                    break
+            moves = list(board.legal_moves(colour))
+            if moves:
+                node.kind = AND_NODE
+                node.moves = moves
+                node.proof, node.disproof = len(moves), 1
+                node.eliminated = tuple(eliminated)
+                return
+            eliminated.append(colour)
+            engine.eliminate_apply()
+        node.proof, node.disproof = PN_INF, 0
+
+    #True if the move just made through the engine was the attacker's and
+    #took the target out in check from the attacker, or took its king
+    def mated(self):
+        board = self.board
+        rec, mover, points, eliminated, to_play, checks = self.engine.line[-1]
+        if COLOUR_INFO[mover] != self.attacker or self.target not in eliminated:
+            return False
+        if board.undo_stack[-1].eliminated == self.target:
+            return True
+        return any(piece.colour == self.attacker
+                for piece in checks.get(self.target, ()))
+
+    #Legal moves of the attacker that leave the target's king attacked by
+    #it (or take it), those checking most kings at once (which score bonuses) first. The
+    #moves are made in full so the attack counts follow them
+    def checking_moves(self):
+        board = self.board
+        aidx = COLOUR_INFO.index(self.attacker)
+        target_sq = board.geometry.index[board.king_loc[self.target]]
+        checks = []
+        for rec in list(board.legal_moves(self.attacker)):
+            board.make(rec)
+            counts = board.attack_maps.counts[aidx]
+            if self.target not in board.king_loc or counts[target_sq]:
+                kings = 0
+                for colour, king_loc in board.king_loc.items():
+                    if (colour != self.attacker and
+                            counts[board.geometry.index[king_loc]]):
+                        kings = kings + 1
+                checks.append((-kings, len(checks), rec))
+            board.unmake()
+        return [rec for kings, i, rec in sorted(checks)]
+
+    def enter(self, node):
+        for colour in node.eliminated:
+            self.engine.eliminate_apply(colour)
+
+    def unwind(self, base):
+        while len(self.engine.line) > base:
+            self.engine.move_undo()
+
+    #Proved line - the mating move below the attacker and a defence below
+    #the others
+    def line(self, root):
+        line = []
+        node = root
+        while node.children:
+            node = next(child for child in node.children if child.proof == 0)
+            line.append(node.move)
+        return line
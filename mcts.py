@@ -0,0 +1,187 @@
+import math
+import random
+from chess import COLOUR_INFO
+from engine import Engine, MAX_SUM
+
+#UCT exploration constant for rewards in [0, 1]
+EXPLORATION = 1.4
+
+#Plies a playout runs before the position is scored - the game seldom ends
+#in reach of a playout, so the reward is the evaluation share at the end
+PLAYOUT_PLIES = 40
+
+#Tree nodes kept at most, past this playouts run from the leaves without
+#adding nodes
+MAX_NODES = 200000
+
+#Node of the search tree - the position after move (None for the root).
+#colour is the colour index to play once colours with no legal move are
+#eliminated (eliminated, replayed on every visit) and None at the end of the
+#game. rewards sums the playout reward vectors by colour index
+class Node:
+    def __init__(self, move = None, parent = None):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.eliminated = ()
+        self.colour = None
+        self.key = None
+        self.visits = 0
+        self.rewards = [0.0, 0.0, 0.0, 0.0]
+
+    #UCT value for the colour that played move
+    def uct(self, log_visits):
+        mover = self.parent.colour
+        return (self.rewards[mover]/self.visits +
+                EXPLORATION*math.sqrt(log_visits/self.visits))
+
+#Monte Carlo tree search with UCT selection and random playouts. Moves and
+#eliminations go through Engine so points are won as in score_update, and
+#the reward vector is each colour's share of the evaluation (Board.scores
+#plus points won, then material) at the end of the playout. The tree is kept
+#between searches and the root moved down to the node of the position
+#reached by the moves played on the board since
+class MonteCarlo:
+    def __init__(self, board, max_nodes = MAX_NODES, seed = None):
+        self.board = board
+        self.engine = Engine(board)
+        self.max_nodes = max_nodes
+        self.rand = random.Random(seed)
+        self.root = None
+        self.root_moves = 0
+        self.size = 0
+        self.playout_moves = 0
+
+    #Runs iterations playouts from the current position and returns
+    #(most visited move, its visits, its mean reward vector)
+    def search(self, iterations = 1000):
+        board = self.board
+        self.root_update()
+        if self.root.colour is None or self.root.eliminated:
+            return None, 0, None
+        self.playout_moves = 0
+        for i in range(iterations):
+            self.iterate()
+        #No iterations run, or the tree was full - any legal move will do
+        if not self.root.children:
+            return self.rand.choice(self.root.untried), 0, None
+        best = max(self.root.children, key = lambda child: child.visits)
+        return (best.move, best.visits,
+                [reward/best.visits for reward in best.rewards])
+
+    def best_move(self, iterations = 1000):
+        return self.search(iterations)[0]
+
+    #One selection, expansion, playout and backup, leaving the board as found
+    def iterate(self):
+        engine = self.engine
+        base = len(engine.line)
+        node = self.root
+        self.enter(node)
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key = lambda child: child.uct(log_visits))
+            engine.move_apply(node.move)
+            self.enter(node)
+        if node.untried and self.size < self.max_nodes:
+            i = self.rand.randrange(len(node.untried))
+            rec = node.untried[i]
+            node.untried[i] = node.untried[-1]
+            node.untried.pop()
+            child = Node(rec, node)
+            node.children.append(child)
+            self.size = self.size + 1
+            engine.move_apply(rec)
+            self.enter(child)
+            node = child
+        reward = self.playout()
+        while len(engine.line) > base:
+            engine.move_undo()
+
+        while node is not None:
+            node.visits = node.visits + 1
+            for cidx in range(4):
+                node.rewards[cidx] = node.rewards[cidx] + reward[cidx]
+            node = node.parent
+
+    #Brings the board to node's position once its move is made - the first
+    #visit eliminates colours left without a legal move and lists the moves,
+    #later visits replay the eliminations
+    def enter(self, node):
+        engine = self.engine
+        if node.untried is not None:
+            for colour in node.eliminated:
+                engine.eliminate_apply(colour)
+            return
+        board = self.board
+        eliminated = []
+        node.untried = []
+        while not engine.terminal():
+            moves = list(board.legal_moves(board.to_play))
+            if moves:
+                node.untried = moves
+                node.colour = COLOUR_INFO.index(board.to_play)
+                break
+            eliminated.append(board.to_play)
+            engine.eliminate_apply()
+        node.eliminated = tuple(eliminated)
+        node.key = board.hash()
+
+    #Random legal moves to the end of the game or PLAYOUT_PLIES
+    def playout(self):
+        board = self.board
+        engine = self.engine
+        for ply in range(PLAYOUT_PLIES):
+            if engine.terminal():
+                break
+            rec = board.random_move(board.to_play, self.rand)
+            if rec is None:
+                engine.eliminate_apply()
+            else:
+                engine.move_apply(rec)
+                self.playout_moves = self.playout_moves + 1
+        return [share/MAX_SUM for share in engine.shares(engine.evaluate())]
+
+    #Moves the root to the node reached by the moves played since the last
+    #search, dropping the rest of the tree, or starts a new tree when the
+    #position is not in it
+    def root_update(self):
+        board = self.board
+        node = self.root
+        if node is not None and self.root_moves <= len(board.move_list):
+            for move in board.move_list[self.root_moves:]:
+                start = board.geometry.index[move.start]
+                end = board.geometry.index[move.end]
+                node = next((child for child in node.children
+                        if child.move.start == start and child.move.end == end),
+                        None)
+                if node is None:
+                    break
+        else:
+            node = None
+
+        #Board.move has already taken out colours with no legal move, so a
+        #kept node's eliminations are not replayed
+        if node is not None and node.key == board.hash():
+            node.parent = None
+            node.eliminated = ()
+            self.root = node
+            self.size = self.tree_size(node)
+        else:
+            self.root = Node()
+            self.size = 1
+            base = len(self.engine.line)
+            self.enter(self.root)
+            while len(self.engine.line) > base:
+                self.engine.move_undo()
+        self.root_moves = len(board.move_list)
+
+    def tree_size(self, node):
+        size = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            size = size + 1
+            stack.extend(node.children)
+        return size
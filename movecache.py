@@ -0,0 +1,155 @@
+from mailbox import TYPE_CODES, TYPE_MASK
+
+PAWN = TYPE_CODES['Pawn']
+
+#Legal moves per colour kept per piece square - entries[colour][sq] is the
+#tuple of legal move records of the piece on sq. A square change drops the
+#entry of the square and of every piece that can see it (the first piece
+#along each ray and the knight squares), so only moves that could have
+#changed are regenerated. Legality of the cached moves rests on the
+#colour's king square, checkers and pins, when any of these differ from
+#when the entries were made the colour's entries are cleared. The status is
+#only looked at again once a square on the king's lines or knight squares
+#(or the king square) has changed. Kings and
+#pawns that may capture en passant (which depends on the move number) are
+#never cached
+class MoveCache:
+    def __init__(self, board):
+        self.board = board
+        self.entries = {}
+        self.status = {}
+        self.watch = {}
+
+        #Non-zero while Board.legal_test tries a move and takes it back, the
+        #position is unchanged afterwards so nothing needs dropping
+        self.hold = 0
+
+    #Drops the entries a change on square sq may have made stale
+    def square_changed(self, sq):
+        if self.hold or not self.entries:
+            return
+        board = self.board
+        tables = board.attack_maps.tables
+        occ = board.attack_maps.occ
+        seen = [sq]
+        for d, ray in enumerate(tables.rays[sq]):
+            blockers = ray & occ
+            if not blockers:
+                continue
+            if tables.positive[d]:
+                seen.append((blockers & -blockers).bit_length() - 1)
+            else:
+                seen.append(blockers.bit_length() - 1)
+        seen.extend(board.geometry.knight[sq])
+        for entries in self.entries.values():
+            for seen_sq in seen:
+                entries.pop(seen_sq, None)
+        for colour, mask in list(self.watch.items()):
+            if (mask >> sq) & 1:
+                del self.watch[colour]
+
+    def clear(self):
+        self.entries = {}
+        self.status = {}
+        self.watch = {}
+
+    #King square, checker squares and pins of colour that cached legality
+    #depends on
+    def colour_status(self, colour):
+        board = self.board
+        king_loc = board.king_loc.get(colour)
+        if king_loc is None:
+            return None
+        king_sq = board.geometry.index[king_loc]
+        checkers = ()
+        if board.square_attacked(colour, king_sq):
+            checkers = tuple(sorted(board.geometry.index[piece.loc]
+                    for piece in board.check_test(colour, king_loc)))
+        return king_sq, checkers, board.pins(colour)
+
+    #Entries of colour, cleared first if its check or pin status changed.
+    #A colour in check is filled in one go from the evasion generator
+    def colour_entries(self, colour):
+        if colour in self.watch:
+            return self.entries[colour]
+        status = self.colour_status(colour)
+        if colour not in self.entries or self.status[colour] != status:
+            self.status[colour] = status
+            self.entries[colour] = {}
+            if status is not None and status[1]:
+                self.evasion_fill(colour)
+        if status is not None:
+            king_sq = status[0]
+            tables = self.board.attack_maps.tables
+            self.watch[colour] = (tables.lines[king_sq] |
+                    tables.knight[king_sq] | (1 << king_sq))
+        return self.entries[colour]
+
+    def evasion_fill(self, colour):
+        board = self.board
+        entries = self.entries[colour]
+        moves = {}
+        for piece in self.cached_pieces(colour):
+            moves[board.geometry.index[piece.loc]] = []
+        for rec in board.evasion_moves(colour):
+            if rec.start in moves:
+                moves[rec.start].append(rec)
+        for sq, recs in moves.items():
+            entries[sq] = tuple(recs)
+
+    #Live pieces of colour whose moves can be cached
+    def cached_pieces(self, colour):
+        for piece in self.board.piece_pos[colour]:
+            if piece.loc is None or piece.dead or not self.cacheable(piece):
+                continue
+            yield piece
+
+    def cacheable(self, piece):
+        if piece.name == 'King':
+            return False
+        if piece.name == 'Pawn':
+            board = self.board
+            start = board.geometry.index[piece.loc]
+            forward = board.pawn_steps[piece.direction][start][0]
+            if (forward is not None and
+                    board.mailbox.get(forward) & TYPE_MASK == PAWN):
+                return False
+        return True
+
+    #Legal moves of a single piece, from the cache when possible
+    def piece_moves(self, piece, entries = None):
+        board = self.board
+        if entries is None:
+            entries = self.colour_entries(piece.colour)
+        sq = board.geometry.index[piece.loc]
+        if sq in entries:
+            return entries[sq]
+        moves = tuple(rec for rec in board.piece_moves(piece)
+                if board.legal_test(rec))
+        if self.cacheable(piece):
+            entries[sq] = moves
+        return moves
+
+    #Every legal move of colour
+    def moves(self, colour):
+        entries = self.colour_entries(colour)
+        moves = []
+        for piece in self.board.piece_pos[colour]:
+            if piece.loc is not None and not piece.dead:
+                moves.extend(self.piece_moves(piece, entries))
+        return moves
+
+    #True if colour has a legal move - cached mobility answers without
+    #generating anything, uncached pieces are only tried until one moves
+    def has_moves(self, colour):
+        entries = self.colour_entries(colour)
+        if any(entries.values()):
+            return True
+        for piece in self.board.piece_pos[colour]:
+            if piece.loc is None or piece.dead:
+                continue
+            if self.board.geometry.index[piece.loc] in entries:
+                continue
+            if self.piece_moves(piece, entries):
+                return True
+        return False
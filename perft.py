@@ -0,0 +1,370 @@
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+from chess import Board, COLOUR_INFO
+from engine import Engine
+from mate import MateSearch
+
+#FEN4 strings as read by Board.fen_to_board - side to play, colours in the
+#game, king side and queen side castling rights, scores and the half move
+#count, then the rows from rank 14 down to rank 1
+CASTLE_FEN = ('R-1,1,1,1-1,1,1,1-1,1,1,1-0,0,0,0-0-\n'
+        '3,yR,2,yK,3,yR,3/\n'
+        '3,yP,yP,yP,yP,yP,yP,yP,yP,3/\n'
+        '14/\n'
+        'bR,bP,10,gP,gR/\n'
+        '1,bP,10,gP,1/\n'
+        '1,bP,10,gP,1/\n'
+        'bK,bP,10,gP,1/\n'
+        '1,bP,10,gP,gK/\n'
+        '1,bP,10,gP,1/\n'
+        '1,bP,10,gP,1/\n'
+        'bR,bP,9,gB,gP,gR/\n'
+        '14/\n'
+        '3,rP,rP,rP,rP,rP,rP,1,rP,3/\n'
+        '3,rR,3,rK,2,rR,3')
+
+ENPASSANT_FEN = ('B-1,1,1,1-1,1,1,1-1,1,1,1-0,0,0,0-0-\n'
+        '3,yR,yN,yB,yK,yQ,yB,yN,yR,3/\n'
+        '3,yP,yP,yP,yP,yP,yP,yP,yP,3/\n'
+        '14/\n'
+        'bR,bP,10,gP,gR/\n'
+        'bN,bP,10,gP,gN/\n'
+        'bB,bP,10,gP,gB/\n'
+        'bK,bP,10,gP,gQ/\n'
+        'bQ,bP,10,gP,gK/\n'
+        'bB,bP,10,gP,gB/\n'
+        'bN,bP,1,rP,8,gP,gN/\n'
+        'bR,bP,10,gP,gR/\n'
+        '14/\n'
+        '4,rP,rP,rP,rP,rP,rP,rP,3/\n'
+        '3,rR,rN,rB,rQ,rK,rB,rN,rR,3')
+
+PROMOTION_FEN = ('R-1,1,1,1-0,0,0,0-0,0,0,0-0,0,0,0-0-\n'
+        '6,yK,yQ,6/\n'
+        '14/\n'
+        '7,gP,6/\n'
+        '1,bN,12/\n'
+        '7,gP,6/\n'
+        '6,bP,6,gB/\n'
+        'bK,3,yP,2,yN,yP,5/\n'
+        '3,gR,2,rP,2,rP,3,gK/\n'
+        '14/\n'
+        '14/\n'
+        '6,bP,7/\n'
+        '14/\n'
+        '14/\n'
+        '7,rK,2,rR,3')
+
+DEAD_FEN = ('B-1,1,1,0-1,1,1,1-1,1,1,1-0,0,0,0-0-\n'
+        '3,yR,yN,yB,yK,yQ,yB,yN,yR,3/\n'
+        '3,yP,yP,yP,yP,yP,yP,yP,yP,3/\n'
+        '14/\n'
+        'bR,bP,10,gP,gR/\n'
+        'bN,bP,10,gP,gN/\n'
+        'bB,bP,10,gP,gB/\n'
+        'bK,bP,10,gP,gQ/\n'
+        'bQ,bP,10,gP,gK/\n'
+        'bB,bP,10,gP,gB/\n'
+        'bN,bP,10,gP,gN/\n'
+        'bR,bP,10,gP,gR/\n'
+        '14/\n'
+        '3,rP,rP,rP,rP,rP,rP,rP,rP,3/\n'
+        '3,rR,rN,rB,rQ,rK,rB,rN,rR,3')
+
+#Red king boxed in by Blue pieces that guard each other and do not attack it
+BOXED_FEN = ('R-1,1,1,1-1,1,1,1-1,1,1,1-0,0,0,0-0-\n'
+        '3,yR,yN,yB,yK,yQ,yB,yN,yR,3/\n'
+        '3,yP,yP,yP,yP,yP,yP,yP,yP,3/\n'
+        '14/\n'
+        'bR,bP,10,gP,gR/\n'
+        '1,bP,10,gP,gN/\n'
+        'bB,bP,10,gP,gB/\n'
+        'bK,bP,10,gP,gQ/\n'
+        'bQ,bP,10,gP,gK/\n'
+        'bB,bP,10,gP,gB/\n'
+        '1,bP,10,gP,gN/\n'
+        'bR,bP,10,gP,gR/\n'
+        '9,bN,4/\n'
+        '3,rP,rP,rP,bN,bB,bN,rP,rP,3/\n'
+        '3,rR,rN,rB,bN,rK,bN,rN,rR,3')
+
+#Red to play mates Yellow in one with e5-e14 along rank 14
+MATE_FEN = ('R-1,1,1,1-0,0,0,0-0,0,0,0-0,0,0,0-0-\n'
+        '7,yK,yB,5/\n'
+        '6,yP,yP,yP,5/\n'
+        '14/\n'
+        '14/\n'
+        '14/\n'
+        '14/\n'
+        '13,gK/\n'
+        'bK,13/\n'
+        '14/\n'
+        '4,rR,9/\n'
+        '14/\n'
+        '14/\n'
+        '14/\n'
+        '7,rK,6')
+
+#Reference positions with their node counts from depth 1. fen None is the
+#start position from piece_init and moves are played with Board.move (or
+#'resign' for the side to play) before counting
+SUITE = [
+        {'name': 'start', 'fen': None, 'moves': [],
+            'nodes': [20, 399, 7960, 158402]},
+        {'name': 'castling', 'fen': CASTLE_FEN, 'moves': [],
+            'nodes': [21, 524, 13079, 442390]},
+        {'name': 'enpassant', 'fen': ENPASSANT_FEN, 'moves': ['b6-d6'],
+            'nodes': [20, 399, 8758, 200995]},
+        {'name': 'promotion', 'fen': PROMOTION_FEN, 'moves': [],
+            'nodes': [23, 230, 6895, 224093]},
+        {'name': 'dead', 'fen': DEAD_FEN, 'moves': [],
+            'nodes': [20, 399, 7960, 187450]},
+        {'name': 'resigned', 'fen': DEAD_FEN, 'moves': ['resign'],
+            'nodes': [5, 100, 2000, 12616]},
+        ]
+
+#Plies deep the running key is checked against a recompute below each suite
+#position, and the seeded random games played to check it along whole games
+KEY_DEPTH = 3
+KEY_GAMES = 4
+KEY_PLIES = 300
+
+#Times smaller the mailbox cells must be than the Square grid they stand in
+#for on ray scans (the grid array, square_list and the Square objects)
+MEMORY_RATIO = 10
+
+#Positions sent through Board.board_to_state and state_to_board, which must
+#come back with the same hash and evaluation
+STATE_CHECKS = [
+        {'name': 'promoted', 'fen': PROMOTION_FEN, 'moves': ['g7-g8']},
+        ]
+
+def position_board(fen = None, moves = ()):
+    board = Board()
+    if fen is not None:
+        board.fen_to_board(fen)
+    for move in moves:
+        if move == 'resign':
+            board.resign_apply(move = False)
+        else:
+            move_start, move_end = move.split('-')
+            board.move(move_start, move_end)
+    return board
+
+#Runs perft to each depth printing nodes, time and nodes/sec
+def perft_run(board, depth):
+    results = []
+    for i in range(1, depth + 1):
+        start = time.time()
+        nodes = board.perft(i)
+        elapsed = time.time() - start
+        nps = int(nodes/elapsed) if elapsed > 0 else 0
+        print('depth {} nodes {} time {:.3f}s nps {}'.format(i, nodes,
+                elapsed, nps))
+        results.append(nodes)
+    return results
+
+def divide_run(board, depth):
+    divide = board.perft_divide(depth)
+    for move, nodes in sorted(divide.items()):
+        print('{} {}'.format(move, nodes))
+    print('moves {} nodes {}'.format(len(divide), sum(divide.values())))
+
+#Checks every suite position against its recorded counts up to max_depth
+def suite_run(max_depth):
+    passed = True
+    total_nodes = 0
+    start = time.time()
+    for position in SUITE:
+        board = position_board(position['fen'], position['moves'])
+        for depth, expected in enumerate(position['nodes'][:max_depth]):
+            nodes = board.perft(depth + 1)
+            total_nodes = total_nodes + nodes
+            result = 'ok' if nodes == expected else 'FAIL'
+            if nodes != expected:
+                passed = False
+            print('{} depth {} nodes {} expected {} {}'.format(
+                    position['name'], depth + 1, nodes, expected, result))
+    elapsed = time.time() - start
+    print('nodes {} time {:.3f}s nps {}'.format(total_nodes, elapsed,
+            int(total_nodes/elapsed) if elapsed > 0 else 0))
+    for position in SUITE:
+        board = position_board(position['fen'], position['moves'])
+        if not key_check(position['name'], board, min(max_depth, KEY_DEPTH)):
+            passed = False
+    for seed in range(KEY_GAMES):
+        if not key_game_check(seed):
+            passed = False
+        if not points_game_check(seed):
+            passed = False
+    for check in STATE_CHECKS:
+        if not state_check(check):
+            passed = False
+    if not boxed_resign_check():
+        passed = False
+    if not mate_check():
+        passed = False
+    if not memory_check():
+        passed = False
+    return passed
+
+def key_check(name, board, depth):
+    nodes, bad = key_walk(board, depth)
+    print('{} key nodes {} mismatches {} {}'.format(name, nodes, bad,
+            'ok' if bad == 0 else 'FAIL'))
+    return bad == 0
+
+#Nodes of the move tree depth plies deep, walked with make/unmake, and how
+#many of them have a running key differing from Board.hash_recompute
+def key_walk(board, depth):
+    bad = 0 if board.hash() == board.hash_recompute() else 1
+    nodes = 1
+    if depth > 0:
+        for rec in list(board.legal_moves(board.to_play)):
+            board.make(rec)
+            sub_nodes, sub_bad = key_walk(board, depth - 1)
+            board.unmake()
+            nodes, bad = nodes + sub_nodes, bad + sub_bad
+    return nodes, bad
+
+#Plays a seeded random game with Board.move, resigning now and then, checking
+#the running key after every move
+def key_game_check(seed):
+    rand = random.Random(seed)
+    board = Board()
+    plies, bad = 0, 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not board.game_over and plies < KEY_PLIES:
+            if (rand.random() < 0.01 and
+                    len(board.colours) - len(board.resign_list) > 2):
+                board.resign_apply(move = False)
+            rec = board.random_move(board.to_play, rand)
+            if rec is None:
+                break
+            board.move(*board.move_code(rec))
+            plies = plies + 1
+            if board.hash() != board.hash_recompute():
+                bad = bad + 1
+    print('game {} key plies {} mismatches {} {}'.format(seed, plies, bad,
+            'ok' if bad == 0 else 'FAIL'))
+    return bad == 0
+
+#Plays a seeded random game with Board.move, trying every move first with
+#Engine.move_apply - the points it gives the mover and the colours it takes
+#out must be those of Board.move
+def points_game_check(seed):
+    rand = random.Random(seed)
+    board = Board()
+    engine = Engine(board)
+    plies, eliminated, bad = 0, 0, 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not board.game_over and plies < KEY_PLIES:
+            if (rand.random() < 0.01 and
+                    len(board.colours) - len(board.resign_list) > 2):
+                board.resign_apply(move = False)
+            rec = board.random_move(board.to_play, rand)
+            if rec is None:
+                break
+            engine.move_apply(rec)
+            gains, colours = list(engine.gains), list(board.colours)
+            engine.move_undo()
+            scores = [board.scores[colour] for colour in COLOUR_INFO]
+            in_game = len(board.colours)
+            board.move(*board.move_code(rec))
+            plies = plies + 1
+            eliminated = eliminated + in_game - len(board.colours)
+            if board.game_over:
+                break
+            if (colours != board.colours or gains != [board.scores[colour] -
+                    score for colour, score in zip(COLOUR_INFO, scores)]):
+                bad = bad + 1
+    print('game {} points plies {} eliminated {} mismatches {} {}'.format(
+            seed, plies, eliminated, bad, 'ok' if bad == 0 else 'FAIL'))
+    return bad == 0
+
+#Resigns Red in BOXED_FEN, where its king has no move - Red leaves the game
+#and the turn passes to Blue
+def boxed_resign_check():
+    board = position_board(BOXED_FEN)
+    with contextlib.redirect_stdout(io.StringIO()):
+        board.resign_apply()
+    ok = (board.to_play == 'Blue' and 'Red' not in board.colours and
+            not board.resign_list and not board.move_list and
+            board.hash() == board.hash_recompute() and
+            next(board.legal_moves('Blue'), None) is not None)
+    print('boxed resigned king {}'.format('ok' if ok else 'FAIL'))
+    return ok
+
+#MateSearch finds the mate in one of MATE_FEN, and the engine scores it for
+#Red and takes Yellow out straight away as Board.move does
+def mate_check():
+    board = position_board(MATE_FEN)
+    line = MateSearch(board).mate_find('Yellow', 1)
+    found = [board.move_code(rec) for rec in line] if line else None
+    engine = Engine(board)
+    rec = next(rec for rec in board.legal_moves('Red')
+            if board.move_code(rec) == ('e5', 'e14'))
+    engine.move_apply(rec)
+    gains, colours = list(engine.gains), list(board.colours)
+    engine.move_undo()
+    ok = (found == [('e5', 'e14')] and gains == [20, 0, 0, 0] and
+            colours == ['Red', 'Blue', 'Green'] and
+            board.hash() == board.hash_recompute())
+    print('mate in one {} {}'.format(found, 'ok' if ok else 'FAIL'))
+    return ok
+
+#Compares the bytes of a start board's mailbox cells with its Square grid
+def memory_check():
+    board = Board()
+    cells = sys.getsizeof(board.mailbox.cells)
+    grid = (sys.getsizeof(board.squares) + sys.getsizeof(board.square_list) +
+            sum(sys.getsizeof(square) for square in board.square_list))
+    ok = grid >= MEMORY_RATIO*cells
+    print('mailbox bytes {} square grid bytes {} {}'.format(cells, grid,
+            'ok' if ok else 'FAIL'))
+    return ok
+
+#Round trips a STATE_CHECKS position through a new board
+def state_check(check):
+    board = position_board(check['fen'], check['moves'])
+    copy = Board()
+    copy.state_to_board(board.board_to_state())
+    ok = (copy.hash() == board.hash() and
+            copy.evaluation() == board.evaluation() and
+            copy.board_to_state() == board.board_to_state())
+    print('{} state round trip {}'.format(check['name'],
+            'ok' if ok else 'FAIL'))
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description = '4 player chess perft')
+    parser.add_argument('depth', type = int, nargs = '?', default = 3)
+    parser.add_argument('--fen', default = None,
+            help = 'FEN4 string or file to start from')
+    parser.add_argument('--moves', nargs = '*', default = [],
+            help = 'moves such as h2-h4 (or resign) played first')
+    parser.add_argument('--divide', action = 'store_true')
+    parser.add_argument('--suite', action = 'store_true',
+            help = 'check the reference positions up to depth')
+    args = parser.parse_args()
+
+    if args.suite:
+        return 0 if suite_run(args.depth) else 1
+
+    fen = args.fen
+    if fen is not None and not fen.startswith(('R-', 'B-', 'Y-', 'G-')):
+        with open(fen) as fen_file:
+            fen = fen_file.read()
+    board = position_board(fen, args.moves)
+    if args.divide:
+        divide_run(board, args.depth)
+    else:
+        perft_run(board, args.depth)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
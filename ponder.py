@@ -0,0 +1,135 @@
+import multiprocessing
+import queue
+from chess import Board
+from engine import Engine, PARANOID
+from transposition import SharedTranspositionTable
+
+#Table size in megabytes shared by the ponder process and think
+PONDER_MB = 64
+
+#Seconds stop waits for the ponder process to finish its search
+STOP_WAIT = 1.0
+
+#Pondering for the engine seat of colour - while the other colours are to
+#play a background process searches the position for colour with iterative
+#deepening (so over every reply of the side to play), storing into a
+#SharedTranspositionTable. Board.move tells the Ponderer of each move made:
+#an opponent's move restarts the ponder search from the new position, which
+#finds the subtree of the reply played already in the table, and colour's
+#turn stops it (Engine checks the stop flag every STOP_NODES nodes) so think
+#searches with the table filled. results holds the ponder search's finished
+#depths for the position pondered
+class Ponderer:
+    def __init__(self, board, colour, strategy = PARANOID, mb = PONDER_MB):
+        self.board = board
+        self.colour = colour
+        self.strategy = strategy
+        self.mb = mb
+        self.tt = SharedTranspositionTable(mb)
+        self.stop_event = multiprocessing.Event()
+        self.positions = multiprocessing.Queue()
+        self.replies = multiprocessing.Queue()
+        self.seq = 0
+        self.running = False
+        self.results = []
+        shape = (board.nrows, board.ncols, board.corner, board.rules,
+                board.prom_rf)
+        self.process = multiprocessing.Process(target = ponder_worker,
+                args = (shape, colour, strategy, self.tt.name, mb,
+                self.positions, self.replies, self.stop_event),
+                daemon = True)
+        self.process.start()
+        board.move_listeners.append(self.board_moved)
+        self.board_moved(board)
+
+    #Move listener of the board - ponders while the other colours are to
+    #play and stops on colour's turn or at the end of its game
+    def board_moved(self, board):
+        if (board.to_play == self.colour or board.game_over or
+                self.colour not in board.colours):
+            self.stop()
+        else:
+            self.ponder()
+
+    #Restarts the ponder search from the position on the board
+    def ponder(self):
+        self.stop()
+        self.stop_event.clear()
+        self.seq = self.seq + 1
+        self.results = []
+        self.running = True
+        self.positions.put((self.seq, self.board.board_to_state()))
+
+    #Stops the ponder search, waiting for the process to finish with it
+    def stop(self):
+        if not self.running:
+            return
+        self.stop_event.set()
+        try:
+            while self.running:
+                self.reply_get(STOP_WAIT)
+        except queue.Empty:
+            print('Ponder search did not stop in time')
+            self.running = False
+
+    #Takes a reply of the ponder process - a finished depth of the position
+    #pondered is kept in results
+    def reply_get(self, timeout = None):
+        reply = self.replies.get(timeout = timeout)
+        if reply['seq'] != self.seq:
+            return
+        if reply.get('done'):
+            self.running = False
+        else:
+            self.results.append(reply)
+
+    #Takes the replies waiting and returns the deepest result of the
+    #position pondered so far (the move is the reply expected of the side to
+    #play), or None
+    def result(self):
+        while True:
+            try:
+                self.reply_get(0)
+            except queue.Empty:
+                break
+        return self.results[-1] if self.results else None
+
+    #Searches for colour's move once it is to play with Engine.think on the
+    #table the ponder search filled
+    def think(self, hard_ms = None, soft_ms = None, max_depth = 64,
+            callback = None):
+        self.stop()
+        self.tt.new_search()
+        engine = Engine(self.board, self.strategy, self.tt)
+        return engine.think(hard_ms, soft_ms, max_depth, callback)
+
+    def close(self):
+        self.stop()
+        if self.board_moved in self.board.move_listeners:
+            self.board.move_listeners.remove(self.board_moved)
+        self.positions.put(None)
+        self.process.join()
+        self.tt.close()
+        self.tt.unlink()
+
+#Ponders each position put on positions in the ponder process until None,
+#putting every finished depth and a done reply on replies
+def ponder_worker(shape, colour, strategy, table_name, mb, positions, replies,
+            stop_event):
+    tt = SharedTranspositionTable(mb, name = table_name)
+    board = Board(*shape)
+    try:
+        while True:
+            item = positions.get()
+            if item is None:
+                break
+            seq, state = item
+            board.state_to_board(state)
+            engine = Engine(board, strategy, tt)
+            engine.stop_event = stop_event
+            for result in engine.iterate(colour = colour):
+                result['seq'] = seq
+                replies.put(result)
+            replies.put({'seq': seq, 'done': True})
+    finally:
+        tt.close()
@@ -0,0 +1,147 @@
+import argparse
+import contextlib
+import functools
+import io
+import multiprocessing
+import random
+import time
+from chess import Board, COLOUR_INFO
+from engine import Engine, PARANOID, MAXN, BRS
+from mcts import MonteCarlo
+
+#Plies after which a game is stopped unfinished
+MAX_PLIES = 2000
+
+#Games handed to a worker at a time
+CHUNK_GAMES = 4
+
+#Policies pick the move of the side to play on the board they were made
+#for. A policy is made per game and colour by calling policy(board, rand)
+#- a class below, a functools.partial of one with its options set or any
+#other picklable callable returning an object with move()
+
+#Random legal move, any piece (Board.random_move)
+class RandomPolicy:
+    def __init__(self, board, rand):
+        self.board = board
+        self.rand = rand
+
+    def move(self):
+        return self.board.random_move(self.board.to_play, self.rand)
+
+#Best move of an Engine search to depth
+class EnginePolicy:
+    def __init__(self, board, rand, depth = 2, strategy = PARANOID):
+        self.engine = Engine(board, strategy)
+        self.depth = depth
+
+    def move(self):
+        return self.engine.best_move(self.depth)
+
+#Most visited move of MonteCarlo after iterations playouts, the tree kept
+#between moves
+class MctsPolicy:
+    def __init__(self, board, rand, iterations = 200):
+        self.search = MonteCarlo(board, seed = rand.getrandbits(64))
+        self.iterations = iterations
+
+    def move(self):
+        return self.search.best_move(self.iterations)
+
+#Plays games games (numbered from 0) in a pool of workers processes and
+#writes each to path in PGN4 as it finishes, returning a dict of games,
+#moves, time, games_per_sec and moves_per_sec. policies is a policy for
+#every colour or a list of one per colour index. Game index is played with
+#random.Random(seed + index), so game_play(index, seed, ...) plays it again.
+#The first opening_plies plies are random to vary the games of
+#deterministic policies
+def selfplay(games, path, policies = RandomPolicy, workers = None, seed = 0,
+            max_plies = MAX_PLIES, opening_plies = 0):
+    if not isinstance(policies, (list, tuple)):
+        policies = [policies]*len(COLOUR_INFO)
+    tasks = ((index, seed, policies, max_plies, opening_plies)
+            for index in range(games))
+    start = time.time()
+    moves = 0
+    with open(path, 'w') as pgn_file, multiprocessing.Pool(workers) as pool:
+        for index, game_pgn, plies, scores in pool.imap_unordered(game_task,
+                tasks, CHUNK_GAMES):
+            pgn_file.write(game_pgn)
+            moves = moves + plies
+    elapsed = time.time() - start
+    stats = {'games': games, 'moves': moves, 'time': elapsed,
+            'games_per_sec': games/elapsed if elapsed > 0 else 0,
+            'moves_per_sec': moves/elapsed if elapsed > 0 else 0}
+    print('{} games {} moves in {:.1f}s - {:.2f} games/s {:.0f} moves/s'
+            .format(games, moves, elapsed, stats['games_per_sec'],
+            stats['moves_per_sec']))
+    return stats
+
+def game_task(task):
+    return game_play(*task)
+
+#Plays game index from the starting position, returning (index, PGN4 text
+#with tags, plies played, final scores by colour index). The game is
+#stopped early once adjudicate(board) is true if given. Board's messages
+#(checkmates and so on) are not printed
+def game_play(index, seed, policies, max_plies = MAX_PLIES,
+            opening_plies = 0, adjudicate = None):
+    rand = random.Random(seed + index)
+    board = Board()
+    players = [policy(board, rand) for policy in policies]
+    termination = 'Game over'
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not board.game_over:
+            if len(board.move_list) >= max_plies:
+                termination = 'Ply limit'
+                break
+            if adjudicate is not None and adjudicate(board):
+                termination = 'Adjudicated'
+                break
+            if len(board.move_list) < opening_plies:
+                rec = board.random_move(board.to_play, rand)
+            else:
+                rec = players[COLOUR_INFO.index(board.to_play)].move()
+            if rec is None:
+                termination = 'No move'
+                break
+            board.move(*board.move_code(rec))
+
+    scores = [board.scores[colour] for colour in COLOUR_INFO]
+    tags = [('Variant', 'FFA'), ('Game', index), ('Seed', seed + index),
+            ('Termination', termination),
+            ('Scores', ','.join(str(score) for score in scores))]
+    game_pgn = ''.join('[{} "{}"]\n'.format(name, value)
+            for name, value in tags)
+    game_pgn = game_pgn + board.moves_pgn().lstrip('\n') + '\n\n'
+    return index, game_pgn, len(board.move_list), scores
+
+def main():
+    parser = argparse.ArgumentParser(description = '4 player chess self-play')
+    parser.add_argument('games', type = int)
+    parser.add_argument('path', help = 'PGN4 file written')
+    parser.add_argument('--policy', default = 'random',
+            choices = ['random', 'engine', 'mcts'])
+    parser.add_argument('--depth', type = int, default = 2)
+    parser.add_argument('--strategy', default = PARANOID,
+            choices = [PARANOID, MAXN, BRS])
+    parser.add_argument('--iterations', type = int, default = 200)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--max-plies', type = int, default = MAX_PLIES)
+    parser.add_argument('--opening-plies', type = int, default = 0)
+    args = parser.parse_args()
+
+    if args.policy == 'engine':
+        policy = functools.partial(EnginePolicy, depth = args.depth,
+                strategy = args.strategy)
+    elif args.policy == 'mcts':
+        policy = functools.partial(MctsPolicy, iterations = args.iterations)
+    else:
+        policy = RandomPolicy
+    selfplay(args.games, args.path, policy, args.workers, args.seed,
+            args.max_plies, args.opening_plies)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
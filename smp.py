@@ -0,0 +1,76 @@
+import multiprocessing
+import queue as queue_module
+from engine import Engine, PARANOID
+from transposition import SharedTranspositionTable
+
+#Table size in megabytes shared by the workers
+SMP_MB = 64
+
+#Hard limit in milliseconds of a search given neither hard_ms nor soft_ms,
+#and seconds between looks at whether the workers are still alive
+SMP_MS = 10000
+SMP_POLL = 0.5
+
+#Lazy SMP - workers processes each search their own copy of board from the
+#same root with iterative deepening, sharing one SharedTranspositionTable
+#so that what one finds orders and cuts the others' searches. Odd workers
+#start a depth ahead so the workers spread over two depths. Each finished
+#depth is passed to callback as it arrives (with the worker number) and the
+#deepest result (the first to arrive at that depth) is returned, or the
+#first move in search order if no worker finished a depth. A worker that
+#dies without reporting counts as finished
+def lazy_smp(board, workers = 4, strategy = PARANOID, max_depth = 64,
+            hard_ms = None, soft_ms = None, mb = SMP_MB, callback = None):
+    if hard_ms is None and soft_ms is None:
+        hard_ms = SMP_MS
+    tt = SharedTranspositionTable(mb)
+    queue = multiprocessing.Queue()
+    processes = []
+    finished = set()
+    best = None
+    try:
+        for index in range(workers):
+            process = multiprocessing.Process(target = smp_worker,
+                    args = (board, index, strategy, tt.name, mb, max_depth,
+                    hard_ms, soft_ms, queue))
+            process.start()
+            processes.append(process)
+
+        while len(finished) < workers:
+            try:
+                result = queue.get(timeout = SMP_POLL)
+            except queue_module.Empty:
+                for index, process in enumerate(processes):
+                    if not process.is_alive():
+                        finished.add(index)
+                continue
+            if isinstance(result, int):
+                finished.add(result)
+                continue
+            if callback is not None:
+                callback(result)
+            if best is None or result['depth'] > best['depth']:
+                best = result
+    finally:
+        for process in processes:
+            process.join()
+        tt.close()
+        tt.unlink()
+    if best is None:
+        best = Engine(board, strategy).think(hard_ms = 0)
+    return best
+
+#Searches in a worker process, putting each finished depth on queue and
+#the worker number when done
+def smp_worker(board, index, strategy, table_name, mb, max_depth, hard_ms,
+            soft_ms, queue):
+    tt = SharedTranspositionTable(mb, name = table_name)
+    try:
+        engine = Engine(board, strategy, tt)
+        for result in engine.iterate(max_depth, hard_ms, soft_ms,
+                start_depth = 1 + index % 2):
+            result['worker'] = index
+            queue.put(result)
+    finally:
+        queue.put(index)
+        tt.close()
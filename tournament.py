@@ -0,0 +1,239 @@
+import argparse
+import functools
+import math
+import multiprocessing
+from chess import COLOUR_INFO
+from engine import PARANOID, MAXN, BRS, MATE_POINTS
+from selfplay import (game_play, RandomPolicy, EnginePolicy, MctsPolicy,
+        MAX_PLIES)
+
+#SPRT hypotheses (Elo of the first configuration over the second) and error
+#rates
+ELO0 = 0
+ELO1 = 10
+ALPHA = 0.05
+BETA = 0.05
+
+#Games played at most by a match left undecided
+MAX_GAMES = 20000
+
+#Random plies opening every game, so deterministic engines do not repeat
+#the same games
+OPENING_PLIES = 8
+
+#Configuration (0 for the first, 1 for the second) of each colour index -
+#every way to seat two of each, so both play every colour and every turn
+#order equally often
+SEATINGS = ((0, 1, 0, 1), (1, 0, 1, 0), (0, 0, 1, 1), (1, 1, 0, 0),
+        (0, 1, 1, 0), (1, 0, 0, 1))
+
+#Plays first against second (policies as in selfplay) in four-seat games
+#on a pool of workers processes, game index seated by SEATINGS[index % 6].
+#A game is won by the configuration whose two colours score more between
+#them. After each game a sequential probability ratio test of elo0 against
+#elo1 is made and the match stops once it is decided ('H1' - first is the
+#stronger by elo1, 'H0' - not by elo0) or after max_games games. Games are
+#adjudicated once the scores decide them (outcome_decided) when adjudicate
+#is set, written to path in PGN4 if given and callback is called with the
+#match dict returned after each - wins, draws and losses of first, games,
+#score, elo, llr, lower, upper and result (None if undecided)
+def match(first, second, elo0 = ELO0, elo1 = ELO1, alpha = ALPHA,
+            beta = BETA, max_games = MAX_GAMES, workers = None, seed = 0,
+            max_plies = MAX_PLIES, opening_plies = OPENING_PLIES,
+            adjudicate = True, path = None, callback = None):
+    lower, upper = sprt_bounds(alpha, beta)
+    stats = {'wins': 0, 'draws': 0, 'losses': 0, 'games': 0, 'score': None,
+            'elo': None, 'llr': 0.0, 'lower': lower, 'upper': upper,
+            'result': None}
+    tasks = ((index, seed, (first, second), max_plies, opening_plies,
+            adjudicate) for index in range(max_games))
+    pgn_file = open(path, 'w') if path is not None else None
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            for game_pgn, outcome in pool.imap_unordered(match_game, tasks):
+                if outcome > 0:
+                    stats['wins'] = stats['wins'] + 1
+                elif outcome < 0:
+                    stats['losses'] = stats['losses'] + 1
+                else:
+                    stats['draws'] = stats['draws'] + 1
+                stats['games'] = stats['games'] + 1
+                if pgn_file is not None:
+                    pgn_file.write(game_pgn)
+                match_update(stats, elo0, elo1)
+                if callback is not None:
+                    callback(stats)
+                if stats['result'] is not None:
+                    break
+    finally:
+        if pgn_file is not None:
+            pgn_file.close()
+    return stats
+
+#Plays every pair of configs a match, returning the match dicts by pair of
+#indices into configs. The games of configs i and j go to path.ivj if path
+#is given, other options are those of match
+def tournament(configs, path = None, **options):
+    results = {}
+    for i in range(len(configs)):
+        for j in range(i + 1, len(configs)):
+            pair_path = None
+            if path is not None:
+                pair_path = '{}.{}v{}'.format(path, i, j)
+            stats = match(configs[i], configs[j], path = pair_path,
+                    **options)
+            results[(i, j)] = stats
+            print('{} v {}: +{} ={} -{} elo {} llr {:.2f} [{:.2f}, {:.2f}] {}'
+                    .format(i, j, stats['wins'], stats['draws'],
+                    stats['losses'], elo_text(stats['elo']), stats['llr'],
+                    stats['lower'], stats['upper'], stats['result']))
+    return results
+
+#Plays game index of a match in a worker, returning (PGN4 text, outcome for
+#the first configuration - 1, 0 or -1)
+def match_game(task):
+    index, seed, configs, max_plies, opening_plies, adjudicate = task
+    seats = SEATINGS[index % len(SEATINGS)]
+    policies = [configs[seat] for seat in seats]
+    adjudicator = None
+    if adjudicate:
+        adjudicator = functools.partial(outcome_decided, seats)
+    index, game_pgn, plies, scores = game_play(index, seed, policies,
+            max_plies, opening_plies, adjudicator)
+    return game_pgn, outcome_get(seats, scores)
+
+#1 if the first configuration's colours score more than the second's, -1
+#if less and 0 if the same
+def outcome_get(seats, scores):
+    totals = [0, 0]
+    for cidx, seat in enumerate(seats):
+        totals[seat] = totals[seat] + scores[cidx]
+    return (totals[0] > totals[1]) - (totals[0] < totals[1])
+
+#True once two colours are left (none resigned) and the outcome is the same
+#whether the first configuration's colours win all the points still to be
+#had and the second's none or the other way round
+def outcome_decided(seats, board):
+    if len(board.colours) > 2 or board.resign_list:
+        return False
+    outcomes = set()
+    for favoured in (0, 1):
+        scores = []
+        for cidx, colour in enumerate(COLOUR_INFO):
+            score = board.scores[colour]
+            if colour in board.colours and seats[cidx] == favoured:
+                score = score + points_left(board, colour)
+            scores.append(score)
+        outcomes.add(outcome_get(seats, scores))
+    return len(outcomes) == 1
+
+#Points colour could still win with one opponent left - every live piece of
+#the opponent captured and the opponent mated (or stalemated). Promoted
+#pieces keep the value of a pawn and with one king to check no check scores
+#a bonus
+def points_left(board, colour):
+    points = MATE_POINTS
+    for other in board.colours:
+        if other == colour:
+            continue
+        for piece in board.piece_pos[other]:
+            if (piece.loc is not None and not piece.dead and
+                    piece.name != 'King'):
+                points = points + piece.value
+    return points
+
+#Sets score, elo, llr and result of the match dict stats from its wins,
+#draws and losses
+def match_update(stats, elo0, elo1):
+    wins, draws, losses = stats['wins'], stats['draws'], stats['losses']
+    games = wins + draws + losses
+    score = (wins + draws/2)/games
+    stats['score'] = score
+    stats['elo'] = None
+    if 0 < score < 1:
+        stats['elo'] = -400*math.log10(1/score - 1)
+    stats['llr'] = sprt_llr(wins, draws, losses, elo0, elo1)
+    if stats['llr'] >= stats['upper']:
+        stats['result'] = 'H1'
+    elif stats['llr'] <= stats['lower']:
+        stats['result'] = 'H0'
+
+#Log-likelihood ratio of elo1 over elo0 from a match, with the game scores
+#taken as normally distributed about their mean (the usual approximation
+#to the trinomial likelihood). Half a game of each result is added for the
+#mean and variance so that a match of one result only still moves
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    total = wins + draws + losses
+    score = (wins + draws/2)/total
+    variance = (wins*(1 - score)**2 + draws*(0.5 - score)**2 +
+            losses*score**2)/total
+    score0 = elo_score(elo0)
+    score1 = elo_score(elo1)
+    return (score1 - score0)*(2*score - score0 - score1)*games/(2*variance)
+
+#(lower, upper) LLR bounds for error rates alpha and beta
+def sprt_bounds(alpha, beta):
+    return math.log(beta/(1 - alpha)), math.log((1 - beta)/alpha)
+
+#Expected score of a side elo stronger
+def elo_score(elo):
+    return 1/(1 + 10**(-elo/400))
+
+def elo_text(elo):
+    return '-' if elo is None else '{:.0f}'.format(elo)
+
+#Policy of a command line config - random, engine[:depth[:strategy]] or
+#mcts[:iterations]
+def config_parse(text):
+    fields = text.split(':')
+    if fields[0] == 'random':
+        return RandomPolicy
+    elif fields[0] == 'engine':
+        depth = int(fields[1]) if len(fields) > 1 else 2
+        strategy = fields[2] if len(fields) > 2 else PARANOID
+        if strategy not in (PARANOID, MAXN, BRS):
+            raise ValueError('Unknown strategy {}'.format(strategy))
+        return functools.partial(EnginePolicy, depth = depth,
+                strategy = strategy)
+    elif fields[0] == 'mcts':
+        iterations = int(fields[1]) if len(fields) > 1 else 200
+        return functools.partial(MctsPolicy, iterations = iterations)
+    raise ValueError('Unknown config {}'.format(text))
+
+def main():
+    parser = argparse.ArgumentParser(description = '4 player chess SPRT '
+            'tournament')
+    parser.add_argument('configs', nargs = '+',
+            help = 'random, engine[:depth[:strategy]] or mcts[:iterations]')
+    parser.add_argument('--elo0', type = float, default = ELO0)
+    parser.add_argument('--elo1', type = float, default = ELO1)
+    parser.add_argument('--alpha', type = float, default = ALPHA)
+    parser.add_argument('--beta', type = float, default = BETA)
+    parser.add_argument('--max-games', type = int, default = MAX_GAMES)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--max-plies', type = int, default = MAX_PLIES)
+    parser.add_argument('--opening-plies', type = int,
+            default = OPENING_PLIES)
+    parser.add_argument('--no-adjudicate', action = 'store_true')
+    parser.add_argument('--pgn', default = None,
+            help = 'PGN4 files written, one per match (PGN.ivj)')
+    args = parser.parse_args()
+
+    if len(args.configs) < 2:
+        parser.error('at least two configs are needed')
+    configs = [config_parse(text) for text in args.configs]
+    tournament(configs, elo0 = args.elo0, elo1 = args.elo1,
+            alpha = args.alpha, beta = args.beta,
+            max_games = args.max_games, workers = args.workers,
+            seed = args.seed, max_plies = args.max_plies,
+            opening_plies = args.opening_plies,
+            adjudicate = not args.no_adjudicate, path = args.pgn)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+from array import array
+from multiprocessing import shared_memory
+import struct
+import numpy as np
+from chess import MoveRec
+
+#Bound types of a stored score - EXACT for a full window result, LOWER when
+#the search failed high (score is at least this) and UPPER when it failed low
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+#Bytes per slot - key (8), packed move (4), depth (1), bound/age (1) and a
+#score per colour (4*4)
+SLOT_BYTES = 30
+NO_MOVE = -1
+EMPTY_DEPTH = -1
+
+#Shared table layout - a header holding the age, then slots of 32 bytes:
+#the key XOR-folded with the three 8-byte words of the payload (packed
+#move, depth, bound/age and a score per colour). A slot read while another
+#process is part way through writing it fails the key test and is a miss
+SHARED_HEADER = struct.Struct('<Q')
+SHARED_CHECK = struct.Struct('<Q')
+SHARED_PAYLOAD = struct.Struct('<ibBxx4i')
+SHARED_WORDS = struct.Struct('<3Q')
+SHARED_SLOT_BYTES = SHARED_CHECK.size + SHARED_PAYLOAD.size
+EMPTY_PAYLOAD = SHARED_PAYLOAD.pack(NO_MOVE, EMPTY_DEPTH, 0, 0, 0, 0, 0)
+
+#Moves are packed into an int as start | end << 8 | flag << 16
+def move_pack(rec):
+    if rec is None:
+        return NO_MOVE
+    return rec.start | (rec.end << 8) | (rec.flag << 16)
+
+def move_unpack(packed):
+    if packed == NO_MOVE:
+        return None
+    return MoveRec(packed & 255, (packed >> 8) & 255, packed >> 16)
+
+#Transposition table in a fixed memory budget of mb megabytes held in flat
+#arrays. Slots come in buckets of two indexed by the low bits of the
+#position key - the first keeps the deepest result (replaced by a deeper or
+#equal search or an entry from an older search) and the second always takes
+#what the first turns away. Scores are per colour vectors indexed by colour
+#index (Piece.direction)
+class TranspositionTable:
+    def __init__(self, mb = 16):
+        self.mb = mb
+        self.buckets = max(1, (mb*1024*1024)//(2*SLOT_BYTES))
+        self.clear()
+
+    #Returns (move, depth, scores, bound) stored for key or None
+    def probe(self, key):
+        slot = (key % self.buckets)*2
+        for i in (slot, slot + 1):
+            if self.depths[i] == EMPTY_DEPTH:
+                continue
+            if self.keys[i] == key:
+                self.hits = self.hits + 1
+                return (move_unpack(self.moves[i]), self.depths[i],
+                        tuple(self.scores[4*i:4*i + 4]), self.info[i] & 3)
+        if self.depths[slot] != EMPTY_DEPTH:
+            self.collisions = self.collisions + 1
+        self.misses = self.misses + 1
+        return None
+
+    def store(self, key, move, depth, scores, bound):
+        slot = (key % self.buckets)*2
+        if not (self.depths[slot] == EMPTY_DEPTH or self.keys[slot] == key or
+                (self.info[slot] >> 2) != self.age or
+                depth >= self.depths[slot]):
+            slot = slot + 1
+        self.keys[slot] = key
+        self.moves[slot] = move_pack(move)
+        self.depths[slot] = min(depth, 127)
+        self.info[slot] = bound | (self.age << 2)
+        self.scores[4*slot:4*slot + 4] = array('i', scores)
+        self.stores = self.stores + 1
+
+    #Marks entries from earlier searches as replaceable - call between moves
+    def new_search(self):
+        self.age = (self.age + 1) % 64
+
+    def clear(self):
+        slots = 2*self.buckets
+        self.keys = array('Q', [0])*slots
+        self.moves = array('i', [NO_MOVE])*slots
+        self.depths = array('b', [EMPTY_DEPTH])*slots
+        self.info = array('B', [0])*slots
+        self.scores = array('i', [0])*(4*slots)
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    #Per mille of the first 1000 slots in use by the current search
+    def hashfull(self):
+        sample = min(1000, 2*self.buckets)
+        used = 0
+        for i in range(sample):
+            if self.depths[i] != EMPTY_DEPTH and (self.info[i] >> 2) == self.age:
+                used = used + 1
+        return used*1000//sample
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'collisions': self.collisions, 'stores': self.stores}
+
+#Transposition table in a multiprocessing.shared_memory buffer that several
+#processes search with at once, without locks. Buckets and replacement are
+#as in TranspositionTable, entries are checked on probing by folding the
+#payload back out of the stored key. Created by the searching process
+#(name None), which clears it and unlinks it when done, and attached to by
+#name from the workers. Counters are per process
+class SharedTranspositionTable:
+    def __init__(self, mb = 16, name = None):
+        self.mb = mb
+        self.buckets = max(1, (mb*1024*1024)//(2*SHARED_SLOT_BYTES))
+        size = SHARED_HEADER.size + 2*self.buckets*SHARED_SLOT_BYTES
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create = True,
+                    size = size)
+            self.clear()
+        else:
+            self.memory = shared_memory.SharedMemory(name = name)
+            self.stats_clear()
+        self.name = self.memory.name
+
+    #Returns (key, move, depth, info, scores) held in slot i, key None if
+    #the slot does not check out
+    def slot_read(self, i):
+        offset = SHARED_HEADER.size + i*SHARED_SLOT_BYTES
+        buf = self.memory.buf
+        check = SHARED_CHECK.unpack_from(buf, offset)[0]
+        payload = bytes(buf[offset + SHARED_CHECK.size:
+                offset + SHARED_SLOT_BYTES])
+        words = SHARED_WORDS.unpack(payload)
+        fields = SHARED_PAYLOAD.unpack(payload)
+        return (check ^ words[0] ^ words[1] ^ words[2], fields[0], fields[1],
+                fields[2], fields[3:])
+
+    def probe(self, key):
+        slot = (key % self.buckets)*2
+        for i in (slot, slot + 1):
+            slot_key, move, depth, info, scores = self.slot_read(i)
+            if depth == EMPTY_DEPTH or slot_key != key:
+                continue
+            self.hits = self.hits + 1
+            return move_unpack(move), depth, scores, info & 3
+        if self.slot_read(slot)[2] != EMPTY_DEPTH:
+            self.collisions = self.collisions + 1
+        self.misses = self.misses + 1
+        return None
+
+    def store(self, key, move, depth, scores, bound):
+        slot = (key % self.buckets)*2
+        age = self.age_get()
+        slot_key, slot_move, slot_depth, info, slot_scores = self.slot_read(slot)
+        if not (slot_depth == EMPTY_DEPTH or slot_key == key or
+                (info >> 2) != age or depth >= slot_depth):
+            slot = slot + 1
+        payload = SHARED_PAYLOAD.pack(move_pack(move), min(depth, 127),
+                bound | (age << 2), *scores)
+        words = SHARED_WORDS.unpack(payload)
+        offset = SHARED_HEADER.size + slot*SHARED_SLOT_BYTES
+        buf = self.memory.buf
+        SHARED_CHECK.pack_into(buf, offset, key ^ words[0] ^ words[1] ^ words[2])
+        buf[offset + SHARED_CHECK.size:offset + SHARED_SLOT_BYTES] = payload
+        self.stores = self.stores + 1
+
+    def age_get(self):
+        return SHARED_HEADER.unpack_from(self.memory.buf, 0)[0]
+
+    def new_search(self):
+        SHARED_HEADER.pack_into(self.memory.buf, 0, (self.age_get() + 1) % 64)
+
+    #Fills every slot with the empty payload in one NumPy copy
+    def clear(self):
+        empty = np.frombuffer(SHARED_CHECK.pack(0) + EMPTY_PAYLOAD,
+                dtype = np.uint8)
+        slots = np.ndarray((2*self.buckets, SHARED_SLOT_BYTES),
+                dtype = np.uint8, buffer = self.memory.buf,
+                offset = SHARED_HEADER.size)
+        slots[:] = empty
+        del slots
+        SHARED_HEADER.pack_into(self.memory.buf, 0, 0)
+        self.stats_clear()
+
+    def stats_clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def hashfull(self):
+        sample = min(1000, 2*self.buckets)
+        age = self.age_get()
+        used = 0
+        for i in range(sample):
+            slot_key, move, depth, info, scores = self.slot_read(i)
+            if depth != EMPTY_DEPTH and (info >> 2) == age:
+                used = used + 1
+        return used*1000//sample
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'collisions': self.collisions, 'stores': self.stores}
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
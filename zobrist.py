@@ -0,0 +1,31 @@
+import random
+
+#Seed for the key generator so every run (and every process) hashes a
+#position to the same key
+ZOBRIST_SEED = 0x4C4E
+
+#Cache of keys per number of squares
+keys_cache = {}
+
+#64-bit random keys for a board of n squares. piece[sq][code] is the key of
+#a mailbox code (type, colour index, dead and resigned bits) on square sq,
+#the empty code 0 has key 0 so a square change is two XORs. to_play,
+#king_castle, queen_castle and in_game are indexed by colour index and ep by
+#the square of a pawn that may be taken en passant
+class ZobristKeys:
+    def __init__(self, n):
+        rand = random.Random(ZOBRIST_SEED)
+        self.piece = []
+        for sq in range(n):
+            self.piece.append([0] + [rand.getrandbits(64) for code in
+                    range(1, 128)])
+        self.to_play = [rand.getrandbits(64) for i in range(4)]
+        self.king_castle = [rand.getrandbits(64) for i in range(4)]
+        self.queen_castle = [rand.getrandbits(64) for i in range(4)]
+        self.in_game = [rand.getrandbits(64) for i in range(4)]
+        self.ep = [rand.getrandbits(64) for sq in range(n)]
+
+def keys_get(n):
+    if n not in keys_cache:
+        keys_cache[n] = ZobristKeys(n)
+    return keys_cache[n]